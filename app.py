@@ -1,14 +1,12 @@
 # Bibliotecas estándar de Python
 import json
+import time
 
 # Manipulación de datos y geometrías
 import pandas as pd
 import geopandas as gpd
 import numpy as np
 
-# Manejo de imágenes
-from PIL import Image
-
 # Integración web y aplicaciones interactivas
 import streamlit as st
 import streamlit_google_oauth as oauth
@@ -22,18 +20,78 @@ from shapely.geometry import shape, mapping, Point
 import rasterio
 from rasterio.features import shapes, geometry_mask
 
-# Interpolación y análisis espacial
-from scipy.interpolate import RBFInterpolator
+# Suavizado de series temporales
+from smoothing import smooth_ndvi, SMOOTHING_METHOD
 
 # Earth Engine y mapeo avanzado
 import ee
 import geemap.foliumap as geemap
 
 # Módulos o paquetes locales
-from helper import translate, api_call_logo, decrypt_token, api_call_fields, domains_areas_by_user, seasons, farms
-from secretManager import AWSSecret
+from helper import translate, decrypt_token, api_call_fields, domains_areas_by_user, prefetch_workspace, cached_seasons, cached_farms, warm_workspaces, warm_seasons, PREFETCH_TTL
+from secretManager import get_secret
+from cache import cache
+from hierarchy import HierarchyIndex, EntityIndex, cached_index
+from fields import prepare_fields
+from assets import FAVICON, POWERED_BY, logo_cache
 import logging
 
+###################################################################################
+# Llamadas a la API cacheadas (compartidas entre sesiones, ver cache.py)
+###################################################################################
+
+# Segundos que se mantienen en el cache los dominios del usuario (y su índice en la sesión)
+DOMAINS_TTL = 600
+
+@cache.cached('domains', ttl=DOMAINS_TTL, tags=lambda user_info, *args: {'user': user_info['email']})
+def get_domains_areas_by_user(user_info, access_key_id, url):
+    api_call = domains_areas_by_user(user_info['email'], access_key_id, url)
+    return api_call
+
+@cache.cached('fields', ttl=600, tags=lambda seasonId, farmId, lang, url, access_key_id, workspaceId, domainId:
+               {'domain': domainId, 'workspace': workspaceId, 'season': seasonId, 'farm': farmId})
+def get_fields(seasonId, farmId, lang, url, access_key_id, workspaceId, domainId):
+    # workspaceId y domainId solo etiquetan la entrada del cache (cache.invalidate(workspace=...))
+    df = api_call_fields(seasonId, farmId, lang, url, access_key_id)
+    return df
+
+###################################################################################
+# Resultados NDVI
+###################################################################################
+
+# Segundos mínimos entre redibujos de la tabla y el gráfico parciales
+RENDER_INTERVAL = 2
+
+def render_ndvi(resultados, tabla, grafico, lang):
+    # Matriz Fecha x Lote armada desde el acumulador, con la fecha como columna
+    pivot_df = resultados.to_wide()
+    if pivot_df.empty:
+        return
+
+    # Mostrar el DataFrame
+    tabla.dataframe(pivot_df)
+
+    import plotly.express as px
+
+    # Convertir la columna 'Date' a datetime si aún no lo es
+    pivot_df['Date'] = pd.to_datetime(pivot_df['Date'])
+
+    # Suavizar todas las series de una vez (Whittaker por defecto, ver smoothing.py)
+    interpolated_df = smooth_ndvi(pivot_df, method=SMOOTHING_METHOD)
+
+    # Usar Plotly Express para crear el gráfico de líneas
+    fig = px.line(interpolated_df, x='Date', y=interpolated_df.columns[1:], markers=True)
+
+    # Actualizar layout del gráfico
+    fig.update_layout(
+        title='NDVI medio por lote a lo largo del tiempo',
+        xaxis_title='Fecha',
+        yaxis_title='NDVI medio',
+        legend_title=translate("field", lang)
+    )
+
+    grafico.plotly_chart(fig, use_container_width=True)
+
 ###################################################################################
 
 def main_app(user_info):
@@ -43,7 +101,7 @@ def main_app(user_info):
 
     st.set_page_config(
         page_title="Benchmarking",
-        page_icon=Image.open("assets/favicon geoagro nuevo-13.png"),
+        page_icon=FAVICON,
         layout="wide",
         initial_sidebar_state="expanded",
         menu_items={
@@ -68,19 +126,15 @@ def main_app(user_info):
     # secrets = None
     # access_key_id = st.secrets["API_key"]
     if env == 'test':
-        secrets = json.loads(AWSSecret().get_secret(secret_name="test/apigraphql360", region_name="us-west-2"))
+        secrets = json.loads(get_secret(secret_name="test/apigraphql360", region_name="us-west-2"))
     elif env == 'prod':
-        secrets = json.loads(AWSSecret().get_secret(secret_name="prod/apigraphql360-v2", region_name="us-west-2"))
+        secrets = json.loads(get_secret(secret_name="prod/apigraphql360-v2", region_name="us-west-2"))
 
     access_key_id = secrets['x-api-key']
     url = secrets['url']
     
-    @st.cache_data
-    def get_logo(user_info, access_key_id, url, default_logo_path):
-        logo_image = api_call_logo(user_info, access_key_id,  url, default_logo_path)
-        return logo_image
-
-    logo_image = get_logo(user_info, access_key_id, url, default_logo_path='assets/GeoAgro_principal.png')
+    # PNG ya decodificado y redimensionado, cacheado por dominio en memoria y en disco (ver assets.py)
+    logo_image = logo_cache.get(user_info['domainId'], url, access_key_id)
     st.session_state['logo_image'] = logo_image
 
     ##################### LANGUAGE  #####################
@@ -118,47 +172,31 @@ def main_app(user_info):
 
         hay_algun_establecimiento_seleccionado=False
 
-        # Función para realizar la llamada a la API y cachear la respuesta
-        @st.cache_data
-        def get_domains_areas_by_user(user_info, access_key_id, url):
-            api_call = domains_areas_by_user(user_info['email'], access_key_id, url)
-            return api_call
-        
-        # Obtener la información de dominio
-        dominios_api = get_domains_areas_by_user(user_info, access_key_id, url)
-
-        # Filtrar y ordenar los dominios
-        dominios_filtrados_ordenados = sorted([dominio for dominio in dominios_api if not dominio['deleted']], key=lambda dominio: dominio['name'])
-
-        # Intentar encontrar el índice del dominio predeterminado en user_info
-        default_domain_index = next((index for index, dominio in enumerate(dominios_filtrados_ordenados) if dominio['id'] == user_info['domainId']), None)
+        # Índice de dominios, áreas y workspaces por usuario; se rehace cuando vence o se
+        # invalida la respuesta cacheada de la que sale
+        jerarquia = cached_index(st.session_state, ('hierarchy', user_info['email']),
+                                 lambda: HierarchyIndex(get_domains_areas_by_user(user_info, access_key_id, url)),
+                                 ttl=DOMAINS_TTL, version=cache.generation)
 
-        # Selector de dominio en Streamlit
-        dominio_seleccionado_nombre = st.selectbox(translate("domain",lang), [dominio['name'] for dominio in dominios_filtrados_ordenados], index=default_domain_index)
-        dominio_seleccionado = next((dominio for dominio in dominios_filtrados_ordenados if dominio['name'] == dominio_seleccionado_nombre), None)
+        # Selector de dominio en Streamlit (las opciones son ids, se muestran los nombres)
+        dominios = jerarquia.domains
+        dominio_seleccionado_id = st.selectbox(translate("domain",lang), dominios.ids, index=dominios.index_of(user_info['domainId']), format_func=dominios.label)
+        dominio_seleccionado = dominios.get(dominio_seleccionado_id)
 
         ############################################################################
         # AREA
         ############################################################################
 
         if dominio_seleccionado:
-            # Obtener áreas del dominio seleccionado y filtrarlas
-            areas_seleccionadas = dominio_seleccionado['areas']
-            areas_filtradas_ordenadas = sorted([area for area in areas_seleccionadas if not area['deleted']], key=lambda area: area['name'])
+            # Áreas del dominio seleccionado, con el área ficticia '--' al inicio
+            areas = jerarquia.areas(dominio_seleccionado['id'])
 
-            # Añadir un área ficticia al inicio
-            area_ficticia = {'name': '--', 'id': 0}
-            areas_filtradas_ordenadas.insert(0, area_ficticia)
-
-            # Intentar encontrar el índice del área predeterminada en user_info
-            default_area_index = next((index for index, area in enumerate(areas_filtradas_ordenadas) if area['id'] == user_info['areaId']), None)
-            # Asegurarse de que el índice no sea None para el área ficticia
-            if default_area_index is None:
-                default_area_index = 0  # Esto seleccionará el área ficticia por defecto si no se encuentra otra área predeterminada
+            # Si no se encuentra el área predeterminada se selecciona el área ficticia
+            default_area_index = areas.index_of(user_info['areaId']) or 0
 
             # Selector de área en Streamlit
-            area_seleccionada_nombre = st.selectbox(translate("area", lang), [area['name'] for area in areas_filtradas_ordenadas], index=default_area_index)
-            area_seleccionada = next((area for area in areas_filtradas_ordenadas if area['name'] == area_seleccionada_nombre), None)
+            area_seleccionada_id = st.selectbox(translate("area", lang), areas.ids, index=default_area_index, format_func=areas.label)
+            area_seleccionada = areas.get(area_seleccionada_id)
 
 
             ############################################################################
@@ -166,71 +204,55 @@ def main_app(user_info):
             ############################################################################
 
             if area_seleccionada:
-                if area_seleccionada['id'] != 0:
-                    # Obtener workspaces del área seleccionada y filtrarlos
-                    workspaces_seleccionados = area_seleccionada['workspaces']
-
-                if area_seleccionada['id'] == 0:
-                    # Obtener workspaces del área seleccionada y filtrarlos
-                    workspaces_seleccionados = dominio_seleccionado['workspaces']
-
-                workspaces_filtrados_ordenados = sorted([workspace for workspace in workspaces_seleccionados if not workspace['deleted']], key=lambda workspace: workspace['name'])
-
-                # Intentar encontrar el índice del workspace predeterminado en user_info
-                default_workspace_index = next((index for index, workspace in enumerate(workspaces_filtrados_ordenados) if workspace['id'] == user_info['workspaceId']), None)
+                # Workspaces del área seleccionada (o del dominio si es el área ficticia)
+                workspaces = jerarquia.workspaces(dominio_seleccionado['id'], area_seleccionada['id'])
 
                 # Selector de workspace en Streamlit
-                workspace_seleccionado_nombre = st.selectbox(translate("workspace",lang), [workspace['name'] for workspace in workspaces_filtrados_ordenados], index=default_workspace_index)
-                workspace_seleccionado = next((workspace for workspace in workspaces_filtrados_ordenados if workspace['name'] == workspace_seleccionado_nombre), None)
+                workspace_seleccionado_id = st.selectbox(translate("workspace",lang), workspaces.ids, index=workspaces.index_of(user_info['workspaceId']), format_func=workspaces.label)
+                workspace_seleccionado = workspaces.get(workspace_seleccionado_id)
 
                 ############################################################################
                 # Season
                 ############################################################################
 
-                # Función para realizar la llamada a la API y cachear la respuesta
-                @st.cache_data
-                def get_seasons(workspaceId, access_key_id, url):
-                    api_call = seasons(workspaceId, access_key_id, url)
-                    return api_call
-                
                 # Si se seleccionó un workspace, obtener las temporadas para ese workspace
                 if workspace_seleccionado:
-                    # Realizar la llamada a la API para obtener las temporadas del workspace seleccionado
-                    seasons_data = get_seasons(workspace_seleccionado['id'], access_key_id, url)
-
-                    # Filtrar y ordenar las temporadas que no están eliminadas
-                    seasons_filtradas_ordenadas = sorted([season for season in seasons_data if not season['deleted']], key=lambda season: season['name'])
-
-                    # Intentar encontrar el índice de la temporada predeterminada en user_info
-                    default_season_index = next((index for index, season in enumerate(seasons_filtradas_ordenadas) if season['id'] == user_info['seasonId']), None)
+                    # Campañas del workspace y establecimientos de la campaña por defecto en un
+                    # solo pedido; las siguientes selecciones se responden desde memoria
+                    def build_seasons_index():
+                        # La campaña por defecto del usuario solo es de su workspace por defecto
+                        season_por_defecto = user_info['seasonId'] if workspace_seleccionado['id'] == user_info['workspaceId'] else None
+                        seasons_data, _ = prefetch_workspace(workspace_seleccionado['id'], season_por_defecto, access_key_id, url, dominio_seleccionado['id'])
+                        if seasons_data is None:
+                            seasons_data = cached_seasons(workspace_seleccionado['id'], access_key_id, url, dominio_seleccionado['id'])
+                        return EntityIndex(seasons_data)
+
+                    seasons_index = cached_index(st.session_state, ('seasons', workspace_seleccionado['id']), build_seasons_index,
+                                                 ttl=PREFETCH_TTL, version=cache.generation)
+
+                    # Precargar en segundo plano las campañas de los workspaces vecinos
+                    warm_workspaces(workspaces.ids, workspace_seleccionado['id'], access_key_id, url, dominio_seleccionado['id'])
 
                     # Selector de temporada en Streamlit
-                    season_seleccionada_nombre = st.selectbox(translate("season",lang), [season['name'] for season in seasons_filtradas_ordenadas], index=default_season_index)
-                    season_seleccionada = next((season for season in seasons_filtradas_ordenadas if season['name'] == season_seleccionada_nombre), None)
+                    season_seleccionada_id = st.selectbox(translate("season",lang), seasons_index.ids, index=seasons_index.index_of(user_info['seasonId']), format_func=seasons_index.label)
+                    season_seleccionada = seasons_index.get(season_seleccionada_id)
 
                     ############################################################################
                     # Farm
                     ############################################################################
 
-                    # Función para realizar la llamada a la API y cachear la respuesta
-                    @st.cache_data
-                    def get_farms(workspaceId, seasonId, access_key_id, url):
-                        api_call = farms(workspaceId, seasonId, access_key_id, url)
-                        return api_call
-
                     # Si se seleccionó una temporada, obtener las granjas para esa temporada y workspace
                     if season_seleccionada:
-                        # Realizar la llamada a la API para obtener las granjas del workspace y la temporada seleccionados
-                        farms_data = get_farms(workspace_seleccionado['id'], season_seleccionada['id'], access_key_id, url)
-
-                        # Filtrar y ordenar las granjas que no están eliminadas
-                        farms_filtradas_ordenadas = sorted([farm for farm in farms_data if not farm['deleted']], key=lambda farm: farm['name'])
+                        # Respuesta desde memoria si ya se precargó
+                        farms_index = cached_index(st.session_state, ('farms', workspace_seleccionado['id'], season_seleccionada['id']),
+                                                   lambda: EntityIndex(cached_farms(workspace_seleccionado['id'], season_seleccionada['id'], access_key_id, url, dominio_seleccionado['id'])),
+                                                   ttl=PREFETCH_TTL, version=cache.generation)
 
-                        # Intentar encontrar el índice de la granja predeterminada en user_info
-                        default_farm_index = next((index for index, farm in enumerate(farms_filtradas_ordenadas) if farm['id'] == user_info['farmId']), None)
+                        # Precargar en segundo plano los establecimientos de las campañas vecinas
+                        warm_seasons(workspace_seleccionado['id'], seasons_index.ids, season_seleccionada['id'], access_key_id, url, dominio_seleccionado['id'])
 
-                        farm_seleccionada_nombre = st.selectbox(translate("farm",lang), [farm['name'] for farm in farms_filtradas_ordenadas], index=default_farm_index)
-                        farm_seleccionada = next((farm for farm in farms_filtradas_ordenadas if farm['name'] == farm_seleccionada_nombre), None)
+                        farm_seleccionada_id = st.selectbox(translate("farm",lang), farms_index.ids, index=farms_index.index_of(user_info['farmId']), format_func=farms_index.label)
+                        farm_seleccionada = farms_index.get(farm_seleccionada_id)
 
                         if farm_seleccionada:
                             hay_algun_establecimiento_seleccionado=True
@@ -259,9 +281,8 @@ def main_app(user_info):
         with cI1:
             pass
         with cI2:
-            image = Image.open('assets/Powered by GeoAgro-01.png')
-            new_image = image.resize((220, 35))
-            st.image(new_image)
+            # Precargada y redimensionada una sola vez al iniciar el proceso
+            st.image(POWERED_BY)
         with cI3:
             pass
 
@@ -273,52 +294,14 @@ def main_app(user_info):
         # LOTES
         ############################################################################
 
-        # Función para realizar la llamada a la API y cachear la respuesta
-        @st.cache_data
-        def get_fields(seasonId, farmId, lang, url, access_key_id):
-            df = api_call_fields(seasonId, farmId, lang, url, access_key_id)
-            return df
-
         # Llamar a la función get_fields_table que está cacheada
-        filtered_df = get_fields(season_seleccionada['id'], farm_seleccionada['id'], lang, url, access_key_id)
-
-        # Convertir la columna 'geometry' de GeoJSON a geometrías de Shapely
-        def geojson_to_geometry(geojson_str):
-            if geojson_str is not None:
-                geojson = json.loads(geojson_str)
-                return shape(geojson)
-            return None
-
-        filtered_df['geometry'] = filtered_df['geometry'].apply(geojson_to_geometry)
-
-        # Eliminar la columna 'geometry' de GeoJSON ya que ya no es necesaria
-        filtered_df = filtered_df.drop('geometryWKB', axis=1, errors='ignore')  # Usamos errors='ignore' para evitar errores si la columna no existe
-
-        # Convertir el DataFrame de Pandas a un GeoDataFrame de GeoPandas
-        gdf_poly = gpd.GeoDataFrame(filtered_df, geometry='geometry')
-
-        # Nombres de columnas originales y sus nuevos nombres
-        renombrar_columnas = {
-            "crop_name": "crop",
-            "hybrid_name": "hybrid",
-            "has": "hectares",
-            "name": translate("field",lang),
-        }
-
-        # Filtrar y mantener solo las columnas que necesitan ser renombradas
-        columnas_para_renombrar = {orig: nuevo for orig, nuevo in renombrar_columnas.items() if orig in gdf_poly.columns}
+        filtered_df = get_fields(season_seleccionada['id'], farm_seleccionada['id'], lang, url, access_key_id,
+                                 workspace_seleccionado['id'], dominio_seleccionado['id'])
 
-        # Renombrar columnas del GeoDataFrame
-        gdf_poly = gdf_poly.rename(columns=columnas_para_renombrar)
-
-        # Paso 1: Eliminar filas donde 'hectares' es nulo
-        gdf_poly = gdf_poly.dropna(subset=['hectares'])
-
-        # Paso 2: Eliminar filas donde 'hectares' es 0
-        gdf_poly = gdf_poly[gdf_poly['hectares'] != 0]
-
-        # Disolver geometrías por 'field_name', sumar los 'hectares' y mantener 'field_name'
-        gdf_poly = gdf_poly.dissolve(by=translate("field",lang), aggfunc={'hectares': 'sum'}).reset_index()
+        # Decodificar, limpiar, disolver y simplificar los lotes (igual que precompute.py,
+        # así se reutiliza lo que ya esté precalculado en el store de NDVI)
+        gdf_ee, (fecha_inicio, fecha_fin), reporte_lotes = prepare_fields(filtered_df, translate("field", lang))
+        logging.info(f"prepare_fields: ventana {fecha_inicio} - {fecha_fin}, {reporte_lotes}")
 
         ############################################################################
         # Mapa
@@ -334,89 +317,55 @@ def main_app(user_info):
         # TAB 1
         ############################################################################
 
-        import ee  # Import the Earth Engine module
-
-        # Crea una instancia de la clase AWSSecret y obtén el secreto para GEE
-        gee_secrets = json.loads(AWSSecret().get_secret(secret_name="prod/streamlit/gee", region_name="us-east-1"))
-
-        # Extrae client_email y la clave privada del secreto
-        client_email = gee_secrets['client_email']
-        private_key = gee_secrets['private_key']  # Asegúrate de que 'private_key' es el nombre correcto del campo en tu secreto
-
-        # Configura las credenciales y inicializa Earth Engine
-        credentials = ee.ServiceAccountCredentials(client_email, key_data=private_key)
-        ee.Initialize(credentials)
-
-        from ndvi import extract_mean_ndvi_date
-        
-        # DataFrame final que almacenará los resultados
-        final_df = pd.DataFrame()
-
-        for index, row in gdf_poly.iterrows():
-            # Extraer la geometría individual
-            lote_gdf_filtrado = gdf_poly.iloc[[index]]
-            
-            # Llamar a la función con la geometría actual
-            df_temp = extract_mean_ndvi_date(lote_gdf_filtrado)
-            
-            # Obtener el nombre de la geometría
-            geom_name = row[translate("field", lang)]
-            
-            # Agregar el nombre de la geometría como columna
-            df_temp[translate("field", lang)] = geom_name
-            
-            # Agregar el DataFrame temporal al DataFrame final
-            final_df = pd.concat([final_df, df_temp], ignore_index=True)
-
-            # Asumiendo que tu DataFrame se llama df
-            pivot_df = final_df.pivot_table(index='Date', columns='Lote', values='Mean_NDVI')
-
-            # Opcionalmente, puedes resetear el índice si prefieres que la fecha sea una columna regular en lugar de el índice del DataFrame
-            pivot_df.reset_index(inplace=True)
-
-        # Mostrar el DataFrame final
-        st.dataframe(pivot_df)
-
-        import plotly.express as px
-
-        # Convertir la columna 'Date' a datetime si aún no lo es
-        pivot_df['Date'] = pd.to_datetime(pivot_df['Date'])
-
-        # Convertir las fechas a un formato numérico (por ejemplo, el número de días desde la primera fecha)
-        pivot_df['DateNum'] = (pivot_df['Date'] - pivot_df['Date'].min()) / np.timedelta64(1, 'D')
-
-        # Preparar un nuevo DataFrame para almacenar los resultados interpolados
-        interpolated_df = pd.DataFrame()
-        interpolated_df['Date'] = pivot_df['Date']
-
-        for column in pivot_df.columns:
-            if column not in ['Date', 'DateNum']:
-                # Filtrar los valores nulos y preparar los datos para la interpolación
-                x = pivot_df.loc[pivot_df[column].notna(), 'DateNum']
-                y = pivot_df.loc[pivot_df[column].notna(), column]
-                
-                # Crear el interpolador RBF
-                rbf = RBFInterpolator(x[:, None], y, kernel='thin_plate_spline')  # Puedes experimentar con diferentes kernels
-                
-                # Interpolar los valores para todas las fechas
-                y_interp = rbf(pivot_df['DateNum'][:, None])
-                
-                # Almacenar los resultados en el DataFrame
-                interpolated_df[column] = y_interp
-
-        # Usar Plotly Express para crear el gráfico de líneas
-        fig = px.line(interpolated_df, x='Date', y=interpolated_df.columns[1:], markers=True)
-
-        # Actualizar layout del gráfico
-        fig.update_layout(
-            title='NDVI medio por lote a lo largo del tiempo',
-            xaxis_title='Fecha',
-            yaxis_title='NDVI medio',
-            legend_title='Lote'
-        )
-
-        # Asumiendo el uso de Streamlit para mostrar el gráfico
-        st.plotly_chart(fig, use_container_width=True)
+        from results import NDVIAccumulator
+        from results_store import ResultsStore
+
+        tabla = st.empty()
+        grafico = st.empty()
+        resultados = NDVIAccumulator(translate("field", lang))
+
+        # Si el resultado del establecimiento ya está guardado para esta misma ventana, lotes y
+        # máscara (p. ej. por precompute.py) se lee la partición Parquet y no se toca Earth Engine
+        from ndvi_store import fields_fingerprint
+
+        claves_resultado = (dominio_seleccionado['id'], farm_seleccionada['id'], season_seleccionada['id'])
+        huella = fields_fingerprint(gdf_ee, translate("field", lang))
+        resultados_store = ResultsStore()
+        if resultados_store.is_current(*claves_resultado, fecha_inicio, fecha_fin, huella):
+            resultados.add_long(resultados_store.read(*claves_resultado, translate("field", lang)))
+        else:
+            # Earth Engine se inicializa una vez por proceso; en los reruns solo se
+            # renuevan las credenciales si vencieron
+            import ee_session
+            ee_session.initialize()
+
+            from ndvi_store import iter_mean_ndvi_cached
+
+            # Extracción de todos los lotes del establecimiento (en lote o concurrente según
+            # ndvi.EXTRACTION_MODE); solo se piden a Earth Engine las fechas que todavía no
+            # están en el store local (ver precompute.py)
+            # La tabla y el gráfico se van completando a medida que llegan las páginas de
+            # resultados (primero lo guardado en el store), sin esperar al último lote
+            progreso = st.progress(0.0, text=translate("extracting_ndvi", lang))
+            fallidos = {}
+            ultimo_dibujo = 0.0
+            for pagina, avance, fallidos in iter_mean_ndvi_cached(gdf_ee, translate("field", lang), start_date=fecha_inicio, end_date=fecha_fin):
+                resultados.add_long(pagina)
+                progreso.progress(avance, text=translate("extracting_ndvi", lang))
+                if len(pagina) and time.monotonic() - ultimo_dibujo >= RENDER_INTERVAL:
+                    render_ndvi(resultados, tabla, grafico, lang)
+                    ultimo_dibujo = time.monotonic()
+            progreso.empty()
+
+            # Los lotes que no se pudieron procesar se informan sin cortar la página y el
+            # resultado no se guarda, así el próximo pedido los vuelve a intentar
+            if fallidos:
+                st.warning(translate("failed_fields", lang) + ", ".join(fallidos))
+            else:
+                resultados_store.write(*claves_resultado, resultados.to_long(), translate("field", lang), fecha_inicio, fecha_fin, huella)
+
+        # Tabla y gráfico completos
+        render_ndvi(resultados, tabla, grafico, lang)
 
 
 ############################################################################
@@ -448,7 +397,7 @@ if __name__ == "__main__":
 #         print(user_info)
 
 #         if user_info is None:
-#             googleoauth_secrets = json.loads(AWSSecret().get_secret(secret_name="prod/streamlit-google-oauth", region_name="us-west-2"))
+#             googleoauth_secrets = json.loads(get_secret(secret_name="prod/streamlit-google-oauth", region_name="us-west-2"))
 #             client_id = googleoauth_secrets['client_id']
 #             client_secret = googleoauth_secrets['client_secret']
 
@@ -0,0 +1,155 @@
+import io
+import os
+import json
+import time
+import hashlib
+import binascii
+import threading
+
+from PIL import Image, UnidentifiedImageError
+
+from helper import domain_logo, decode_base64_logo
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+LOGO_CACHE_DIR = os.environ.get('LOGO_CACHE_DIR', 'logo_cache')
+
+FAVICON_PATH = os.path.join(ASSETS_DIR, 'favicon geoagro nuevo-13.png')
+DEFAULT_LOGO_PATH = os.path.join(ASSETS_DIR, 'GeoAgro_principal.png')
+POWERED_BY_PATH = os.path.join(ASSETS_DIR, 'Powered by GeoAgro-01.png')
+POWERED_BY_SIZE = (220, 35)
+
+# Ancho máximo con que se guarda el logo de un dominio (el encabezado lo muestra chico)
+LOGO_MAX_WIDTH = 400
+# Cada cuánto se pregunta hasLogo a la API para validar el logo cacheado
+LOGO_CHECK_INTERVAL = 600
+# Antigüedad máxima del logo en disco: hasLogo no cambia si se reemplaza un logo por otro
+LOGO_MAX_AGE = 24 * 3600
+
+################################################################################
+# Imágenes estáticas (se cargan una vez al importar el módulo)
+################################################################################
+
+def png_bytes(image, size=None, max_width=None):
+    # Imagen -> PNG ya redimensionado, listo para st.image sin más trabajo en los reruns
+    if size is not None:
+        image = image.resize(size)
+    elif max_width is not None and image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def _load(path):
+    with Image.open(path) as image:
+        image.load()
+        return image
+
+FAVICON = _load(FAVICON_PATH)
+DEFAULT_LOGO = png_bytes(_load(DEFAULT_LOGO_PATH), max_width=LOGO_MAX_WIDTH)
+POWERED_BY = png_bytes(_load(POWERED_BY_PATH), size=POWERED_BY_SIZE)
+
+################################################################################
+# Logos de dominio (memoria + disco, validados con hasLogo)
+################################################################################
+
+class LogoCache:
+    # En memoria: domainId -> (png, hasLogo, validado_en, descargado_en). En disco: <domainId>.png y
+    # <domainId>.json con hasLogo, huella del base64 y fecha de descarga.
+    def __init__(self, path=LOGO_CACHE_DIR, check_interval=LOGO_CHECK_INTERVAL, max_age=LOGO_MAX_AGE):
+        self.path = path
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _files(self, domainId):
+        return os.path.join(self.path, f'{domainId}.png'), os.path.join(self.path, f'{domainId}.json')
+
+    def _read_disk(self, domainId):
+        png_path, meta_path = self._files(domainId)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if not meta['hasLogo']:
+                return None, meta
+            with open(png_path, 'rb') as f:
+                return f.read(), meta
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def _write_disk(self, domainId, png, meta):
+        os.makedirs(self.path, exist_ok=True)
+        png_path, meta_path = self._files(domainId)
+        if png is None and os.path.exists(png_path):
+            os.remove(png_path)
+        # Se escribe a un temporal y se renombra: otro proceso puede estar leyendo
+        for path, content, mode in ((png_path, png, 'wb'), (meta_path, json.dumps(meta), 'w')):
+            if content is None:
+                continue
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, mode) as f:
+                f.write(content)
+            os.replace(tmp, path)
+
+    def _download(self, domainId, url, access_key_id):
+        data = domain_logo(domainId, url, access_key_id)
+        if data is None:
+            return None
+        meta = {'hasLogo': bool(data['hasLogo']), 'fetched_at': time.time(), 'digest': None}
+        png = None
+        if meta['hasLogo']:
+            try:
+                raw = decode_base64_logo(data['base64Logo'])
+                with Image.open(io.BytesIO(raw)) as image:
+                    png = png_bytes(image, max_width=LOGO_MAX_WIDTH)
+                meta['digest'] = hashlib.sha1(data['base64Logo'].encode()).hexdigest()
+            except (binascii.Error, UnidentifiedImageError, OSError) as e:
+                print(f"Error al manejar la imagen: {e}")
+                meta['hasLogo'] = False
+        self._write_disk(domainId, png, meta)
+        return png, meta
+
+    def get(self, domainId, url, access_key_id):
+        # PNG del logo del dominio o DEFAULT_LOGO; en los reruns es una búsqueda en memoria
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(domainId)
+        if cached is not None and now - cached[2] < self.check_interval:
+            return cached[0] or DEFAULT_LOGO
+
+        png, meta = self._read_disk(domainId) if cached is None else (cached[0], {'hasLogo': cached[1], 'fetched_at': cached[3]})
+
+        if meta is not None and now - meta['fetched_at'] < self.max_age:
+            # Validación barata: si hasLogo no cambió, el logo guardado sigue sirviendo
+            current = domain_logo(domainId, url, access_key_id, with_logo=False)
+            if current is None or bool(current['hasLogo']) == meta['hasLogo']:
+                with self._lock:
+                    self._memory[domainId] = (png, meta['hasLogo'], now, meta['fetched_at'])
+                return png or DEFAULT_LOGO
+
+        downloaded = self._download(domainId, url, access_key_id)
+        if downloaded is None:
+            # API caída (o dominio sin id): se usa lo que haya, aunque sea viejo, y se guarda
+            # en memoria para no repetir los reintentos de la API en cada rerun hasta
+            # check_interval. Con descargado_en 0 el próximo intento vuelve a descargar.
+            has_logo, fetched_at = (meta['hasLogo'], meta['fetched_at']) if meta is not None else (False, 0)
+            with self._lock:
+                self._memory[domainId] = (png, has_logo, now, fetched_at)
+            return png or DEFAULT_LOGO
+
+        png, meta = downloaded
+        with self._lock:
+            self._memory[domainId] = (png, meta['hasLogo'], now, meta['fetched_at'])
+        return png or DEFAULT_LOGO
+
+    def invalidate(self, domainId):
+        with self._lock:
+            self._memory.pop(domainId, None)
+        for path in self._files(domainId):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+# Cache compartido por todo el proceso
+logo_cache = LogoCache()
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+import httpx
+
+from graphql_client import RetryPolicy, OperationMetrics, parse_operation_name, DEFAULT_TIMEOUT, MAX_RETRIES, BACKOFF
+from helper import QUERY_SEASONS, QUERY_FARMS, QUERY_FIELDS, fields_dataframe
+
+# Pedidos simultáneos máximos contra AppSync
+MAX_CONCURRENCY = 8
+
+# Los clientes asíncronos duran lo que un fan-out: las métricas se acumulan para todo el proceso
+metrics = OperationMetrics()
+
+################################################################################
+# Cliente GraphQL asíncrono
+################################################################################
+
+class AsyncGraphQLClient:
+    def __init__(self, url, access_key_id, max_concurrency=MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff=BACKOFF, metrics=metrics):
+        self.url = url
+        self.retry = RetryPolicy(max_retries, backoff)
+        self.metrics = metrics
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            headers={
+                'x-api-key': access_key_id,
+                'Content-Type': 'application/json',
+                'Accept-Encoding': 'gzip',
+            },
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    async def execute(self, query, variables=None):
+        operation = parse_operation_name(query)
+        payload = {'query': query, 'variables': variables or {}}
+
+        with self.metrics.timed(operation):
+            for attempt in self.retry.attempts():
+                async with self._semaphore:
+                    try:
+                        response = await self._client.post(self.url, json=payload)
+                    except httpx.TransportError as e:
+                        self.retry.transport_error(operation, e, attempt)
+                        response = None
+
+                # La espera se hace fuera del semáforo para no ocupar un lugar de concurrencia
+                if response is None:
+                    await asyncio.sleep(self.retry.delay(attempt))
+                    continue
+
+                retry, data = self.retry.response(operation, response.status_code, response.json, attempt)
+                if retry:
+                    await asyncio.sleep(self.retry.delay(attempt))
+                    continue
+                return data
+
+################################################################################
+# Consultas en paralelo
+################################################################################
+
+async def _gather(client, calls, convert=None):
+    # calls: {clave: (query, variables)}; convert se aplica a cada respuesta dentro del
+    # mismo gather, así un error de la API o de la conversión queda como None en esa clave
+    async def call(key):
+        data = await client.execute(*calls[key])
+        return data if convert is None else convert(data)
+
+    keys = list(calls)
+    results = await asyncio.gather(*(call(key) for key in keys), return_exceptions=True)
+    return {key: None if isinstance(result, Exception) else result for key, result in zip(keys, results)}
+
+async def seasons_for_workspaces_async(workspace_ids, access_key_id, url, max_concurrency=MAX_CONCURRENCY):
+    async with AsyncGraphQLClient(url, access_key_id, max_concurrency) as client:
+        data = await _gather(client, {ws: (QUERY_SEASONS, {'workspaceId': ws}) for ws in workspace_ids})
+    return {ws: d and d['list_seasons'] for ws, d in data.items()}
+
+async def farms_for_seasons_async(workspaceId, season_ids, access_key_id, url, max_concurrency=MAX_CONCURRENCY):
+    async with AsyncGraphQLClient(url, access_key_id, max_concurrency) as client:
+        data = await _gather(client, {
+            season: (QUERY_FARMS, {'workspaceId': workspaceId, 'seasonId': season}) for season in season_ids})
+    return {season: d and d['list_farms'] for season, d in data.items()}
+
+async def fields_for_farms_async(seasonId, farm_ids, lang, access_key_id, url, max_concurrency=MAX_CONCURRENCY):
+    async with AsyncGraphQLClient(url, access_key_id, max_concurrency) as client:
+        data = await _gather(client, {
+            farm: (QUERY_FIELDS, {'farmId': farm, 'lang': lang, 'seasonId': seasonId}) for farm in farm_ids},
+            convert=fields_dataframe)
+    return data
+
+################################################################################
+# Fachada sincrónica para Streamlit
+################################################################################
+
+def run_sync(coro):
+    # Si el hilo ya tiene un loop corriendo, la corrutina se ejecuta en un hilo aparte
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    result = {}
+    def target():
+        try:
+            result['value'] = asyncio.run(coro)
+        except BaseException as e:
+            result['error'] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+def seasons_for_workspaces(workspace_ids, access_key_id, url, max_concurrency=MAX_CONCURRENCY):
+    return run_sync(seasons_for_workspaces_async(workspace_ids, access_key_id, url, max_concurrency))
+
+def farms_for_seasons(workspaceId, season_ids, access_key_id, url, max_concurrency=MAX_CONCURRENCY):
+    return run_sync(farms_for_seasons_async(workspaceId, season_ids, access_key_id, url, max_concurrency))
+
+def fields_for_farms(seasonId, farm_ids, lang, access_key_id, url, max_concurrency=MAX_CONCURRENCY):
+    return run_sync(fields_for_farms_async(seasonId, farm_ids, lang, access_key_id, url, max_concurrency))
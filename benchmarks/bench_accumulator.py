@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from results import NDVIAccumulator
+
+################################################################################
+# Benchmark: concat + pivot por iteración vs. NDVIAccumulator
+################################################################################
+
+N_DATES = 120
+FIELD_COUNTS = [10, 100, 250, 500, 1000]
+
+def make_field(i, rng):
+    dates = pd.date_range('2024-01-01', periods=N_DATES, freq='3D').strftime('%Y-%m-%d')
+    values = rng.uniform(0.1, 0.9, N_DATES).round(3)
+    values[rng.random(N_DATES) < 0.3] = np.nan  # fechas nubladas
+    return f'Lote {i:04d}', pd.DataFrame({'Date': dates, 'Mean_NDVI': values})
+
+def concat_and_pivot(fields):
+    # Lo que hacía el loop de main_app
+    final_df = pd.DataFrame()
+    for name, df in fields:
+        df = df.copy()
+        df['Lote'] = name
+        final_df = pd.concat([final_df, df], ignore_index=True)
+        pivot_df = final_df.pivot_table(index='Date', columns='Lote', values='Mean_NDVI')
+        pivot_df.reset_index(inplace=True)
+    return pivot_df
+
+def accumulate(fields):
+    acc = NDVIAccumulator('Lote')
+    for name, df in fields:
+        acc.add(name, df)
+    return acc.to_wide()
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print(f"{'fields':>7} {'concat+pivot (s)':>18} {'accumulator (s)':>16} {'speedup':>8}")
+
+    for n in FIELD_COUNTS:
+        fields = [make_field(i, rng) for i in range(n)]
+        t_old, old = timed(concat_and_pivot, fields)
+        t_new, new = timed(accumulate, fields)
+
+        pd.testing.assert_frame_equal(old, new, check_names=False)
+        print(f'{n:>7} {t_old:>18.3f} {t_new:>16.3f} {t_old / t_new:>7.1f}x')
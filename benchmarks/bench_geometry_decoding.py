@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+import geopandas as gpd
+from shapely.geometry import shape, mapping, Polygon, MultiPolygon
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from geometry import fields_to_gdf
+
+################################################################################
+# Benchmark: apply(json.loads + shape) por fila vs. decodificación vectorizada
+################################################################################
+
+FIELD_COUNTS = [100, 1000, 5000]
+VERTICES = 400
+MULTI_SHARE = 0.3
+
+def make_polygon(cx, cy, rng):
+    # Polígono irregular de VERTICES vértices (~500 m de radio)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, VERTICES))
+    radius = 0.005 * rng.uniform(0.8, 1.2, VERTICES)
+    return Polygon(np.column_stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)]))
+
+def make_fields(n, rng):
+    geometries = []
+    for i in range(n):
+        cx, cy = -60 + (i % 100) * 0.02, -34 + (i // 100) * 0.02
+        polygon = make_polygon(cx, cy, rng)
+        if rng.random() < MULTI_SHARE:
+            polygon = MultiPolygon([polygon, make_polygon(cx + 0.011, cy, rng)])
+        geometries.append(polygon)
+
+    return pd.DataFrame({
+        'name': [f'Lote {i}' for i in range(n)],
+        'has': rng.uniform(10, 200, n),
+        'geometry': [json.dumps(mapping(g)) for g in geometries],
+        'geometryWKB': [g.wkb_hex for g in geometries],
+    })
+
+def row_wise(df):
+    # Lo que hacía main_app
+    def geojson_to_geometry(geojson_str):
+        if geojson_str is not None:
+            return shape(json.loads(geojson_str))
+        return None
+
+    df = df.copy()
+    df['geometry'] = df['geometry'].apply(geojson_to_geometry)
+    df = df.drop('geometryWKB', axis=1, errors='ignore')
+    return gpd.GeoDataFrame(df, geometry='geometry')
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print(f"{'fields':>7} {'row-wise (s)':>13} {'geojson (s)':>12} {'wkb (s)':>8}")
+
+    for n in FIELD_COUNTS:
+        df = make_fields(n, rng)
+        t_old, old = timed(row_wise, df)
+        t_json, new = timed(fields_to_gdf, df.drop(columns='geometryWKB'))
+        t_wkb, new_wkb = timed(fields_to_gdf, df)
+
+        assert shapely.equals_exact(old.geometry.values, new.geometry.values, 1e-9).all()
+        assert shapely.equals_exact(old.geometry.values, new_wkb.geometry.values, 1e-9).all()
+        print(f'{n:>7} {t_old:>13.3f} {t_json:>12.3f} {t_wkb:>8.3f}')
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ndvi import MASK_STRATEGIES
+
+################################################################################
+# Benchmark: costo y diferencias de NDVI entre estrategias de máscara de nubes
+################################################################################
+
+# --record extrae con Earth Engine y guarda los tiempos y las series en el fixture;
+# sin --record se comparan las series guardadas contra la estrategia de referencia.
+# El fixture no está en el repo (hacen falta credenciales de Earth Engine para grabarlo):
+#   python benchmarks/bench_masking.py --record --fields lotes.geojson --field-col name
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'masking.json')
+REFERENCE = 's2cloudless'
+
+def record(fields_path, field_col, start_date, end_date, fixture):
+    import geopandas as gpd
+    import ee_session
+    from ndvi import extract_mean_ndvi_batch
+
+    ee_session.initialize()
+    gdf = gpd.read_file(fields_path).to_crs('EPSG:4326')
+
+    modes = {}
+    for mask in MASK_STRATEGIES:
+        # Tiempo de pared de los getInfo: incluye la red, que es igual para todas
+        start = time.perf_counter()
+        df = extract_mean_ndvi_batch(gdf, field_col, start_date, end_date, mask)
+        elapsed = time.perf_counter() - start
+        df = df.rename(columns={field_col: 'field'})
+        modes[mask] = {'seconds': elapsed, 'records': df.to_dict('records')}
+        print(f'{mask:>12} {elapsed:8.1f} s {len(df):>7} rows')
+
+    os.makedirs(os.path.dirname(fixture), exist_ok=True)
+    with open(fixture, 'w') as f:
+        json.dump({'fields': len(gdf), 'start_date': start_date, 'end_date': end_date, 'modes': modes}, f)
+
+def compare(fixture):
+    with open(fixture) as f:
+        data = json.load(f)
+
+    frames = {mask: pd.DataFrame(m['records'], columns=['field', 'Date', 'Mean_NDVI'])
+              for mask, m in data['modes'].items()}
+    reference = frames[REFERENCE]
+    base_seconds = data['modes'][REFERENCE]['seconds']
+
+    print(f"fields: {data['fields']}  window: {data['start_date']} - {data['end_date']}  reference: {REFERENCE}")
+    print(f"{'mask':>12} {'time (s)':>9} {'speedup':>8} {'rows':>7} {'matched':>8} {'mean |Δ|':>9} {'p95 |Δ|':>8} {'max |Δ|':>8}")
+
+    for mask, df in frames.items():
+        seconds = data['modes'][mask]['seconds']
+        merged = reference.merge(df, on=['field', 'Date'], suffixes=('_ref', ''))
+        diff = (merged['Mean_NDVI'] - merged['Mean_NDVI_ref']).abs().dropna().to_numpy()
+        stats = (diff.mean(), np.percentile(diff, 95), diff.max()) if len(diff) else (np.nan,) * 3
+
+        print(f'{mask:>12} {seconds:>9.1f} {base_seconds / seconds:>7.2f}x {len(df):>7} {len(merged):>8} '
+              f'{stats[0]:>9.4f} {stats[1]:>8.4f} {stats[2]:>8.4f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', action='store_true', help='extract with Earth Engine and write the fixture')
+    parser.add_argument('--fields', help='GeoJSON/GeoPackage with the fields to extract (needed with --record)')
+    parser.add_argument('--field-col', default='field')
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--end', default=pd.Timestamp.today().strftime('%Y-%m-%d'))
+    parser.add_argument('--fixture', default=FIXTURE)
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.fields:
+            parser.error('--record needs --fields')
+        record(args.fields, args.field_col, args.start, args.end, args.fixture)
+    elif not os.path.exists(args.fixture):
+        parser.error(f'{args.fixture} not found; record it first with --record --fields <file>')
+
+    compare(args.fixture)
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import streamlit_google_oauth as oauth
+from httpx_oauth.clients.google import GoogleOAuth2
+from httpx_oauth.oauth2 import OAuth2Token
+
+################################################################################
+# Benchmark: costo de un rerun de una sesión ya logueada en streamlit_google_oauth.login
+################################################################################
+
+# No hace pedidos a Google: la URL de autorización se arma localmente y la identidad
+# del token se precarga en el cache, que es el estado de una sesión logueada.
+
+RERUNS = 200
+CLIENT_ID, CLIENT_SECRET = 'bench-client.apps.googleusercontent.com', 'bench-secret'
+REDIRECT_URI = 'http://localhost:8501'
+
+class SessionState(dict):
+    # Lo mínimo de st.session_state que usa login(): acceso por atributo y por clave
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+class FakeStreamlit:
+    def __init__(self, session_state):
+        self.session_state = session_state
+        self.query_params = {}
+
+    def write(self, *args, **kwargs):
+        pass
+
+def old_rerun(session_state):
+    # Lo que hacía login() en cada rerun aunque la sesión ya tuviera token
+    session_state.client = GoogleOAuth2(CLIENT_ID, CLIENT_SECRET)
+    asyncio.run(oauth.write_authorization_url(client=session_state.client, redirect_uri=REDIRECT_URI))
+    return (session_state.user_id, session_state.user_email)
+
+def new_rerun(session_state):
+    return oauth.login(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI)
+
+def timed(fn, session_state):
+    start = time.perf_counter()
+    for _ in range(RERUNS):
+        fn(session_state)
+    return (time.perf_counter() - start) / RERUNS * 1000
+
+if __name__ == '__main__':
+    token = OAuth2Token({'access_token': 'bench-token', 'expires_in': 3600, 'token_type': 'Bearer'})
+    session_state = SessionState(token=token, user_id='1', user_email='user@example.com')
+    oauth.st = FakeStreamlit(session_state)
+    oauth._identities['bench-token'] = (('1', 'user@example.com'), token['expires_at'])
+
+    t_old = timed(old_rerun, session_state)
+    t_new = timed(new_rerun, session_state)
+    assert new_rerun(session_state) == ('1', 'user@example.com')
+
+    print(f'reruns: {RERUNS}')
+    print(f'before (client + asyncio.run per rerun): {t_old:8.3f} ms/rerun')
+    print(f'after  (shared client, cached identity): {t_new:8.3f} ms/rerun')
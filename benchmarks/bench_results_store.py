@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from results_store import ResultsStore
+
+################################################################################
+# Benchmark: lectura de un establecimiento y consulta sobre muchos en el store Parquet
+################################################################################
+
+N_FARMS = 300
+FIELDS_PER_FARM = 40
+N_DATES = 150  # ~1 año y medio de imágenes cada 3-5 días
+
+def make_farm(rng, dates):
+    names = np.repeat([f'Lote {i}' for i in range(FIELDS_PER_FARM)], len(dates))
+    return pd.DataFrame({
+        'field': names,
+        'Date': np.tile(dates, FIELDS_PER_FARM),
+        'Mean_NDVI': rng.uniform(0.1, 0.9, len(names)).round(3),
+    })
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2024-01-01', periods=N_DATES, freq='3D').strftime('%Y-%m-%d')
+
+    with tempfile.TemporaryDirectory() as path:
+        store = ResultsStore(path)
+        t_write = 0.0
+        for farm in range(N_FARMS):
+            t, _ = timed(store.write, 1, farm, 2588 + farm % 2, make_farm(rng, dates), 'field', dates[0], dates[-1])
+            t_write += t
+
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+        rows = N_FARMS * FIELDS_PER_FARM * N_DATES
+
+        t_read, farm_df = timed(store.read, 1, 7, 2589, 'field')
+        t_window, farm_part = timed(store.read, 1, 7, 2589, 'field', '2024-06-01', '2024-09-01', fields=['Lote 3'])
+
+        # NDVI medio de una campaña en todos los establecimientos, de a un RecordBatch
+        def season_mean():
+            total, count = 0.0, 0
+            for batch in store.scan(columns=['mean_ndvi'], season=2588, start_date='2024-06-01'):
+                total += pc.sum(batch.column('mean_ndvi')).as_py() or 0.0
+                count += pc.count(batch.column('mean_ndvi')).as_py()
+            return total / count
+        t_scan, mean = timed(season_mean)
+
+        print(f'farms: {N_FARMS}  rows: {rows}  on disk: {size / 1e6:.1f} MB ({size / rows:.2f} bytes/row)')
+        print(f'write (avg per farm):      {t_write / N_FARMS:8.2f} ms')
+        print(f'read one farm:             {t_read:8.2f} ms ({len(farm_df)} rows)')
+        print(f'read farm, 1 field, 3 mo.: {t_window:8.2f} ms ({len(farm_part)} rows)')
+        print(f'scan season mean:          {t_scan:8.2f} ms (mean {mean:.3f})')
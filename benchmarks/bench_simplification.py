@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+import numpy as np
+import shapely
+import geopandas as gpd
+from shapely.geometry import Polygon
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from geometry import simplify_for_ee, EE_SCALE
+
+################################################################################
+# Benchmark: vértices, payload y NDVI medio antes/después de simplify_for_ee
+################################################################################
+
+# Diferencia máxima admitida en el NDVI medio de un lote
+NDVI_TOLERANCE = 0.005
+N_FIELDS = 200
+VERTEX_SPACING = 1.0  # metros entre vértices, como un contorno digitalizado con GPS
+UTM = 'EPSG:32720'
+
+def make_field(rng):
+    # Polígono de 300-900 m de lado, con bordes densificados y ruido de ±1 m
+    w, h = rng.uniform(300, 900, 2)
+    x0, y0 = rng.uniform(400000, 600000), rng.uniform(6100000, 6300000)
+    corners = np.array([[0, 0], [w, 0], [w, h], [0, h], [0, 0]]) + rng.normal(0, 15, (5, 2))
+    corners[-1] = corners[0]
+
+    points = []
+    for a, b in zip(corners[:-1], corners[1:]):
+        n = int(np.linalg.norm(b - a) / VERTEX_SPACING)
+        points.append(a + (b - a) * np.linspace(0, 1, n, endpoint=False)[:, None])
+    points = np.vstack(points) + rng.uniform(-1, 1, (sum(len(p) for p in points), 2))
+    return Polygon(points + [x0, y0])
+
+def ndvi_surface(x, y, field_seed):
+    # NDVI con gradiente y variabilidad espacial suave dentro del lote
+    rng = np.random.default_rng(field_seed)
+    a, b, c = rng.uniform(-1e-3, 1e-3, 3)
+    return 0.55 + a * (x % 1000) / 10 + 0.1 * np.sin(x / 80 + c * 1000) * np.cos(y / 60) + b
+
+def mean_ndvi(polygon, seed, scale=EE_SCALE):
+    # Media sobre los centros de píxel de 10 m dentro del polígono (como reduceRegion)
+    minx, miny, maxx, maxy = polygon.bounds
+    xs = np.arange(np.floor(minx / scale) * scale, maxx, scale) + scale / 2
+    ys = np.arange(np.floor(miny / scale) * scale, maxy, scale) + scale / 2
+    x, y = np.meshgrid(xs, ys)
+    inside = shapely.contains_xy(polygon, x, y)
+    return ndvi_surface(x[inside], y[inside], seed).mean()
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    fields = gpd.GeoDataFrame(geometry=[make_field(rng) for _ in range(N_FIELDS)], crs=UTM).to_crs('EPSG:4326')
+
+    start = time.perf_counter()
+    simplified, report = simplify_for_ee(fields)
+    elapsed = time.perf_counter() - start
+
+    before = fields.to_crs(UTM).geometry.values
+    after = simplified.to_crs(UTM).geometry.values
+    diffs = np.array([abs(mean_ndvi(b, i) - mean_ndvi(a, i)) for i, (b, a) in enumerate(zip(before, after))])
+    payload_before = int(sum(len(shapely.to_geojson(g)) for g in fields.geometry.values))
+
+    print(f'fields:          {N_FIELDS}')
+    print(f'time:            {elapsed:.3f} s')
+    print(f"vertices:        {report['vertices_before']} -> {report['vertices_after']}")
+    print(f"payload (bytes): {payload_before} -> {report['payload_bytes']}")
+    print(f"max area error:  {report['max_area_error']:.4%}")
+    print(f'max |ΔNDVI|:     {diffs.max():.5f} (tolerance {NDVI_TOLERANCE})')
+
+    assert diffs.max() < NDVI_TOLERANCE, 'Simplification changed the mean NDVI beyond tolerance'
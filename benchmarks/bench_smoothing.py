@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from smoothing import smooth_ndvi
+
+################################################################################
+# Benchmark: precisión y tiempo de los suavizadores sobre series sintéticas
+################################################################################
+
+N_DATES = 110  # aprox. un año con revisita de 3-4 días entre ambos satélites
+FIELD_COUNTS = [10, 100, 500]
+METHODS = ['rbf', 'whittaker', 'savgol']
+NOISE = 0.03
+CLOUDY = 0.35
+
+def double_logistic(t, start, end):
+    # Curva típica de un cultivo: sube en la siembra y baja en la cosecha
+    return 0.15 + 0.65 * (1 / (1 + np.exp(-(t - start) / 8)) - 1 / (1 + np.exp(-(t - end) / 8)))
+
+def make_pivot(n_fields, rng):
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.choice(365, N_DATES, replace=False)), unit='D')
+    t = ((dates - dates[0]) / np.timedelta64(1, 'D')).to_numpy()
+
+    truth, observed = {}, {}
+    for i in range(n_fields):
+        start = rng.uniform(60, 200)
+        curve = double_logistic(t, start, start + rng.uniform(80, 140))
+        obs = curve + rng.normal(0, NOISE, len(t))
+        obs[rng.random(len(t)) < CLOUDY] = np.nan
+        truth[f'Lote {i}'] = curve
+        observed[f'Lote {i}'] = obs
+
+    pivot_df = pd.DataFrame({'Date': dates, **observed})
+    return pivot_df, pd.DataFrame(truth)
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print(f"{'fields':>7} {'method':>10} {'time (s)':>9} {'RMSE':>7}")
+
+    for n in FIELD_COUNTS:
+        pivot_df, truth = make_pivot(n, rng)
+        for method in METHODS:
+            start = time.perf_counter()
+            smoothed = smooth_ndvi(pivot_df, method=method)
+            elapsed = time.perf_counter() - start
+
+            rmse = np.sqrt(np.nanmean((smoothed[truth.columns].to_numpy() - truth.to_numpy()) ** 2))
+            print(f'{n:>7} {method:>10} {elapsed:>9.3f} {rmse:>7.4f}')
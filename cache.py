@@ -0,0 +1,217 @@
+import os
+import time
+import pickle
+import sqlite3
+import fnmatch
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+
+# 'memory', 'sqlite', 'redis' (con REDIS_URL) o 'local-redis'
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_PATH = os.environ.get('CACHE_PATH', 'api_cache.sqlite')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 5000))
+DEFAULT_TTL = 600
+
+################################################################################
+# Backends: get(key) -> bytes | None, set(key, value, ttl), delete_matching(pattern)
+################################################################################
+
+class MemoryBackend:
+    # LRU en memoria del proceso
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (value, expires)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_matching(self, pattern):
+        with self._lock:
+            keys = [key for key in self._data if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+
+class SQLiteBackend:
+    # Compartido entre procesos del mismo host (o de un volumen compartido)
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )''')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value FROM cache WHERE key = ? AND expires >= ?', (key, now)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE cache SET last_access = ? WHERE key = ?', (now, key))
+        return None if row is None else row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, expires, last_access) VALUES (?, ?, ?, ?)',
+                         (key, value, now + ttl, now))
+            conn.execute('DELETE FROM cache WHERE expires < ?', (now,))
+            conn.execute('''
+                DELETE FROM cache WHERE key IN (
+                    SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )''', (self.max_entries,))
+
+    def delete_matching(self, pattern):
+        # Los patrones usan solo '*', que GLOB interpreta igual que fnmatch
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM cache WHERE key GLOB ?', (pattern,)).rowcount
+
+
+class RedisBackend:
+    # Cualquier cliente con la interfaz de redis-py: get, set(ex=), delete, scan_iter(match=)
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=int(ttl))
+
+    def delete_matching(self, pattern):
+        keys = list(self.client.scan_iter(match=pattern))
+        if keys:
+            self.client.delete(*keys)
+        return len(keys)
+
+
+class LocalRedis:
+    # Reemplazo local de un servidor Redis para desarrollo (solo los comandos que usa RedisBackend)
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.time()):
+                self._data.pop(key, None)
+                return None
+            return entry[0]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, None if ex is None else time.time() + ex)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            keys = list(self._data)
+        return (key for key in keys if fnmatch.fnmatchcase(key, match))
+
+################################################################################
+# Cache
+################################################################################
+
+class Cache:
+    def __init__(self, backend, default_ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = {}
+        self.misses = {}
+        # Aumenta con cada invalidación: lo que se arma a partir del cache (p. ej. los
+        # índices de hierarchy.cached_index) lo compara para saber si tiene que rehacerse
+        self.generation = 0
+
+    @staticmethod
+    def make_key(namespace, tags, args, kwargs):
+        # Las etiquetas van dentro de la clave para poder invalidar por patrón en cualquier backend.
+        # Cada una con sus propios separadores y ordenadas, así un patrón con varias etiquetas
+        # en el mismo orden exige todas (ver invalidate)
+        digest = hashlib.sha1(pickle.dumps((args, sorted(kwargs.items())))).hexdigest()
+        return f"{namespace}:{''.join(f';{tag};' for tag in sorted(tags))}:{digest}"
+
+    def get(self, namespace, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return None
+        self.hits[namespace] = self.hits.get(namespace, 0) + 1
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        # Los errores de la API (None) no se cachean
+        if value is not None:
+            self.backend.set(key, pickle.dumps(value), self.default_ttl if ttl is None else ttl)
+
+    def cached(self, namespace, ttl=None, tags=None):
+        # tags: función que recibe los mismos argumentos y devuelve p. ej. {'domain': 1, 'farm': 7}
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                tag_values = tags(*args, **kwargs) if tags else {}
+                key = self.make_key(namespace, [f'{k}={v}' for k, v in sorted(tag_values.items())], args, kwargs)
+
+                result = self.get(namespace, key)
+                if result is None:
+                    result = fn(*args, **kwargs)
+                    self.set(key, result, ttl)
+                return result
+            return wrapper
+        return decorator
+
+    def invalidate(self, namespace='*', **tags):
+        # p. ej. cache.invalidate(domain=1), cache.invalidate(workspace=1757) o
+        # cache.invalidate('fields', season=2588, farm=13510): se borran las entradas que
+        # tienen todas las etiquetas indicadas
+        pattern = f'{namespace}:*' + ''.join(f';{tag};*' for tag in sorted(f'{k}={v}' for k, v in tags.items()))
+        self.generation += 1
+        return self.backend.delete_matching(pattern)
+
+    def stats(self):
+        namespaces = set(self.hits) | set(self.misses)
+        return {ns: {'hits': self.hits.get(ns, 0), 'misses': self.misses.get(ns, 0)} for ns in namespaces}
+
+
+def make_backend(name=CACHE_BACKEND):
+    if name == 'sqlite':
+        return SQLiteBackend()
+    if name == 'redis':
+        import redis
+        return RedisBackend(redis.Redis.from_url(os.environ['REDIS_URL']))
+    if name == 'local-redis':
+        return RedisBackend(LocalRedis())
+    return MemoryBackend()
+
+# Cache compartido por todo el proceso
+cache = Cache(make_backend())
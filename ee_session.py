@@ -0,0 +1,69 @@
+import os
+import json
+import threading
+
+import ee
+import google.auth.transport.requests
+
+from secretManager import get_secret
+
+GEE_SECRET_NAME = "prod/streamlit/gee"
+GEE_SECRET_REGION = "us-east-1"
+# Tiempo máximo de cada pedido HTTP a Earth Engine (p. ej. un getInfo). Sin esto un
+# getInfo trabado deja ocupado para siempre al hilo que lo hizo
+REQUEST_TIMEOUT = int(os.environ.get('EE_REQUEST_TIMEOUT', 300))
+
+################################################################################
+# Sesión de Earth Engine (una por proceso)
+################################################################################
+
+_lock = threading.Lock()
+_credentials = None
+
+def _build_credentials():
+    gee_secrets = json.loads(get_secret(secret_name=GEE_SECRET_NAME, region_name=GEE_SECRET_REGION))
+    return ee.ServiceAccountCredentials(gee_secrets['client_email'], key_data=gee_secrets['private_key'])
+
+def _refresh(credentials):
+    try:
+        credentials.refresh(google.auth.transport.requests.Request())
+        return True
+    except Exception:
+        return False
+
+def initialize():
+    # Inicializa Earth Engine la primera vez que se usa y después solo renueva el
+    # token cuando vence; las siguientes llamadas no hacen ningún pedido
+    global _credentials
+    credentials = _credentials
+    if credentials is not None and not credentials.expired:
+        return credentials
+
+    with _lock:
+        if _credentials is None:
+            _credentials = _build_credentials()
+            ee.Initialize(_credentials)
+            ee.data.setDeadline(REQUEST_TIMEOUT * 1000)
+        elif _credentials.expired and not _refresh(_credentials):
+            # Si el token no se puede renovar (p. ej. se rotó la clave) se vuelve a
+            # leer el secreto y se reinicializa la sesión
+            _credentials = _build_credentials()
+            ee.Initialize(_credentials)
+            ee.data.setDeadline(REQUEST_TIMEOUT * 1000)
+        return _credentials
+
+def is_initialized():
+    return _credentials is not None
+
+def health_check(deep=False):
+    # Chequeo barato: sesión creada y token vigente. Con deep=True se hace además
+    # un pedido mínimo a Earth Engine
+    credentials = _credentials
+    if credentials is None or credentials.expired:
+        return False
+    if not deep:
+        return True
+    try:
+        return ee.Number(1).getInfo() == 1
+    except Exception:
+        return False
@@ -0,0 +1,43 @@
+from geometry import fields_to_gdf, dissolve_fields, simplify_for_ee
+from ndvi import season_window
+
+# Nombres de columnas originales y sus nuevos nombres (el del lote depende del idioma)
+COLUMN_NAMES = {
+    "crop_name": "crop",
+    "hybrid_name": "hybrid",
+    "has": "hectares",
+}
+
+################################################################################
+# Preparación de los lotes de un establecimiento para Earth Engine
+################################################################################
+
+def prepare_fields(fields_df, field_col):
+    # La usan la app y precompute.py: las claves del store de NDVI dependen de la
+    # geometría final, así que ambos tienen que llegar exactamente a las mismas.
+    # Devuelve (gdf para EE, (fecha_inicio, fecha_fin), reporte).
+
+    # Decodificar todas las geometrías (WKB si la API lo trae, si no GeoJSON) de una vez
+    gdf = fields_to_gdf(fields_df)
+
+    # Renombrar solo las columnas que vienen en la respuesta
+    renombrar = {**COLUMN_NAMES, "name": field_col}
+    gdf = gdf.rename(columns={orig: nuevo for orig, nuevo in renombrar.items() if orig in gdf.columns})
+
+    # Eliminar los lotes sin hectáreas o con 0 hectáreas
+    gdf = gdf.dropna(subset=['hectares'])
+    gdf = gdf[gdf['hectares'] != 0]
+
+    # Ventana de imágenes de la campaña a partir de las fechas de siembra de los lotes
+    # (se calcula antes de disolver, que descarta crop_date)
+    window = season_window(gdf['crop_date'] if 'crop_date' in gdf.columns else [])
+
+    # Disolver geometrías por nombre de lote sumando las hectáreas
+    # (solo se unen las geometrías de los nombres repetidos)
+    gdf, merged = dissolve_fields(gdf, field_col, aggfunc={'hectares': 'sum'})
+
+    # Simplificar los contornos a la escala de 10 m antes de enviarlos a Earth Engine
+    gdf_ee, report = simplify_for_ee(gdf)
+    report['merged_geometries'] = merged
+
+    return gdf_ee, window, report
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import shapely
+import geopandas as gpd
+
+# Las geometrías de la API vienen en WGS84
+CRS = 'EPSG:4326'
+
+################################################################################
+# Decodificación de geometrías de lotes
+################################################################################
+
+def fields_to_gdf(df, geojson_col='geometry', wkb_col='geometryWKB'):
+    # Decodifica todas las geometrías de una vez con Shapely 2; si la API trae WKB
+    # se usa esa columna (más barata de parsear) y si no, el GeoJSON
+    if wkb_col in df.columns and df[wkb_col].notna().all():
+        geometries = shapely.from_wkb(df[wkb_col].to_numpy(), on_invalid='warn')
+    else:
+        # Los lotes sin geometría quedan en None
+        values = df[geojson_col]
+        geometries = np.full(len(df), None, dtype=object)
+        valid = values.notna().to_numpy()
+        geometries[valid] = shapely.from_geojson(values[valid].to_numpy(), on_invalid='warn')
+
+    df = df.drop(columns=[geojson_col, wkb_col], errors='ignore')
+    return gpd.GeoDataFrame(df, geometry=gpd.GeoSeries(geometries, index=df.index), crs=CRS)
+
+################################################################################
+# Disolución de lotes con el mismo nombre
+################################################################################
+
+def dissolve_fields(gdf, by, aggfunc={'hectares': 'sum'}):
+    # Equivale a gdf.dissolve(by=by, aggfunc=aggfunc).reset_index(), pero solo une
+    # las geometrías de los nombres repetidos. Devuelve también cuántas geometrías
+    # se fusionaron (0 en el caso común de nombres únicos).
+    gdf = gdf[gdf[by].notna()]
+    columns = [by, gdf.geometry.name, *aggfunc]
+    duplicated = gdf[by].duplicated(keep=False).to_numpy()
+
+    if not duplicated.any():
+        result = gdf[columns].sort_values(by, kind='stable')
+        return result.reset_index(drop=True), 0
+
+    repeated = gdf[duplicated]
+    groups = repeated.groupby(by, sort=True)
+    geometries = repeated.geometry.values
+    merged = groups.agg(aggfunc)
+    merged[gdf.geometry.name] = [shapely.union_all(geometries[groups.indices[name]]) for name in merged.index]
+    merged = gpd.GeoDataFrame(merged.reset_index(), geometry=gdf.geometry.name, crs=gdf.crs)
+
+    result = pd.concat([gdf[~duplicated][columns], merged[columns]], ignore_index=True)
+    result = result.sort_values(by, kind='stable').reset_index(drop=True)
+    return result, len(repeated) - len(merged)
+
+################################################################################
+# Simplificación de AOIs antes de enviarlas a Earth Engine
+################################################################################
+
+# La reducción se hace a 10 m: vértices a menos de media celda no cambian el resultado
+EE_SCALE = 10
+# Error relativo de área máximo admitido por lote
+MAX_AREA_ERROR = 0.005
+# Intentos con la mitad de tolerancia antes de dejar la geometría original
+SIMPLIFY_STEPS = 4
+
+def payload_sizes(geometries):
+    # Bytes de GeoJSON de cada geometría, que es lo que viaja en el pedido a EE
+    return np.char.str_len(shapely.to_geojson(np.asarray(geometries)).astype(str))
+
+def simplify_for_ee(gdf, scale=EE_SCALE, max_area_error=MAX_AREA_ERROR):
+    # Simplifica en metros (UTM) con tolerancia scale / 2 preservando la topología.
+    # Si un lote cambia de área más que max_area_error se reintenta con menos
+    # tolerancia y, si no alcanza, se deja la geometría original.
+    report = {'vertices_before': 0, 'vertices_after': 0, 'max_area_error': 0.0, 'payload_bytes': 0}
+    if gdf.empty:
+        return gdf, report
+
+    utm = gdf.estimate_utm_crs()
+    original = np.asarray(gdf.geometry.to_crs(utm).values)
+    areas = shapely.area(original)
+    result = original.copy()
+    errors = np.zeros(len(original))
+    pending = areas > 0
+
+    tolerance = scale / 2
+    for _ in range(SIMPLIFY_STEPS):
+        idx = np.flatnonzero(pending)
+        if not len(idx):
+            break
+        candidate = shapely.simplify(original[idx], tolerance, preserve_topology=True)
+        error = np.abs(shapely.area(candidate) - areas[idx]) / areas[idx]
+        ok = (error <= max_area_error) & shapely.is_valid(candidate) & ~shapely.is_empty(candidate)
+
+        result[idx[ok]] = candidate[ok]
+        errors[idx[ok]] = error[ok]
+        pending[idx[ok]] = False
+        tolerance /= 2
+
+    simplified = gdf.copy()
+    changed = result != original
+    simplified.loc[changed, gdf.geometry.name] = gpd.GeoSeries(result[changed], crs=utm).to_crs(gdf.crs).values
+
+    report['vertices_before'] = int(shapely.get_num_coordinates(np.asarray(gdf.geometry.values)).sum())
+    report['vertices_after'] = int(shapely.get_num_coordinates(np.asarray(simplified.geometry.values)).sum())
+    report['max_area_error'] = float(errors.max())
+    report['payload_bytes'] = int(payload_sizes(simplified.geometry.values).sum())
+    return simplified, report
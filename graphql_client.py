@@ -0,0 +1,155 @@
+import re
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (conexión, lectura) en segundos
+DEFAULT_TIMEOUT = (5, 30)
+MAX_RETRIES = 3
+BACKOFF = 0.5
+POOL_SIZE = 10
+
+# Errores que vale la pena reintentar
+RETRY_STATUS = {429, 500, 502, 503, 504}
+THROTTLING_ERRORS = ('throttl', 'rate exceeded', 'too many requests')
+
+################################################################################
+# Reintentos y métricas (compartidos con el cliente asíncrono de async_api.py)
+################################################################################
+
+class GraphQLError(Exception):
+    pass
+
+
+def parse_operation_name(query):
+    match = re.search(r'(?:query|mutation)\s+(\w+)', query)
+    return match.group(1) if match else 'anonymous'
+
+
+class RetryPolicy:
+    # Qué se reintenta y cuánto se espera; cada cliente solo hace el pedido y la espera
+    def __init__(self, max_retries=MAX_RETRIES, backoff=BACKOFF):
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def attempts(self):
+        return range(self.max_retries + 1)
+
+    def delay(self, attempt):
+        # Espera exponencial con jitter
+        return self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+
+    def transport_error(self, operation, error, attempt):
+        # Error de red: se reintenta salvo en el último intento
+        if attempt == self.max_retries:
+            raise GraphQLError(f'{operation}: {error}') from error
+
+    def response(self, operation, status_code, json, attempt):
+        # (reintentar, datos); lanza GraphQLError si el error es definitivo.
+        # json decodifica el cuerpo (response.json en requests y en httpx)
+        last = attempt == self.max_retries
+        if status_code in RETRY_STATUS and not last:
+            return True, None
+        if status_code != 200:
+            raise GraphQLError(f'{operation}: HTTP {status_code}')
+
+        body = json()
+        errors = body.get('errors')
+        if errors:
+            messages = '; '.join(str(e.get('message', e)) for e in errors)
+            if not last and any(s in messages.lower() for s in THROTTLING_ERRORS):
+                return True, None
+            raise GraphQLError(f'{operation}: {messages}')
+        return False, body['data']
+
+
+class OperationMetrics:
+    # Latencia y errores por operación (la latencia incluye los reintentos)
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, elapsed, error):
+        with self._lock:
+            m = self.metrics.setdefault(operation, {'count': 0, 'errors': 0, 'total_s': 0.0, 'max_s': 0.0})
+            m['count'] += 1
+            m['errors'] += int(error)
+            m['total_s'] += elapsed
+            m['max_s'] = max(m['max_s'], elapsed)
+
+    @contextmanager
+    def timed(self, operation):
+        # Sirve igual dentro de una corrutina: solo mide, no bloquea
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(operation, time.perf_counter() - start, True)
+            raise
+        self.record(operation, time.perf_counter() - start, False)
+
+    def summary(self):
+        with self._lock:
+            return {op: {**m, 'mean_s': m['total_s'] / m['count']} for op, m in self.metrics.items()}
+
+################################################################################
+# Cliente GraphQL (AppSync)
+################################################################################
+
+class GraphQLClient:
+    def __init__(self, url, access_key_id, timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF, pool_size=POOL_SIZE):
+        self.url = url
+        self.timeout = timeout
+        self.retry = RetryPolicy(max_retries, backoff)
+
+        # Una sesión con keep-alive: los pedidos siguientes reutilizan la conexión TLS
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'x-api-key': access_key_id,
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip',
+        })
+
+        self.metrics = OperationMetrics()
+
+    def execute(self, query, variables=None, operation_name=None):
+        operation = operation_name or parse_operation_name(query)
+        payload = {'query': query, 'variables': variables or {}}
+
+        with self.metrics.timed(operation):
+            for attempt in self.retry.attempts():
+                try:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.retry.transport_error(operation, e, attempt)
+                    time.sleep(self.retry.delay(attempt))
+                    continue
+
+                retry, data = self.retry.response(operation, response.status_code, response.json, attempt)
+                if retry:
+                    time.sleep(self.retry.delay(attempt))
+                    continue
+                return data
+
+    def metrics_summary(self):
+        return self.metrics.summary()
+
+
+# Un cliente por (url, api key) para todo el proceso
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(url, access_key_id):
+    with _clients_lock:
+        key = (url, access_key_id)
+        if key not in _clients:
+            _clients[key] = GraphQLClient(url, access_key_id)
+        return _clients[key]
@@ -0,0 +1,84 @@
+import time
+
+################################################################################
+# Índice de la jerarquía dominio -> área -> workspace -> campaña -> establecimiento
+################################################################################
+
+class EntityIndex:
+    # Entidades no eliminadas, ordenadas por nombre y con búsqueda por id en O(1).
+    # Los selectores trabajan con ids, así los nombres repetidos no se confunden.
+
+    def __init__(self, entities, placeholder=None):
+        items = sorted((e for e in entities or [] if not e.get('deleted')), key=lambda e: e['name'])
+        if placeholder is not None:
+            items.insert(0, placeholder)
+
+        self.ids = [e['id'] for e in items]
+        self.by_id = {e['id']: e for e in items}
+        self._position = {id_: i for i, id_ in enumerate(self.ids)}
+
+        by_name = {}
+        for e in items:
+            by_name.setdefault(e['name'], []).append(e['id'])
+        self.by_name = by_name
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_of(self, id_):
+        return self._position.get(id_)
+
+    def get(self, id_):
+        return self.by_id.get(id_)
+
+    def label(self, id_):
+        # Si hay nombres repetidos se agrega el id para poder distinguirlos
+        name = self.by_id[id_]['name']
+        return name if len(self.by_name[name]) == 1 else f'{name} ({id_})'
+
+
+# Área ficticia para elegir los workspaces que cuelgan directo del dominio
+NO_AREA = {'name': '--', 'id': 0}
+
+
+class HierarchyIndex:
+    def __init__(self, domains_payload):
+        self.domains = EntityIndex(domains_payload)
+        self._areas = {}
+        self._workspaces = {}
+
+        for domain in self.domains.by_id.values():
+            areas = EntityIndex(domain.get('areas'), placeholder=NO_AREA)
+            self._areas[domain['id']] = areas
+            self._workspaces[(domain['id'], NO_AREA['id'])] = EntityIndex(domain.get('workspaces'))
+            for area in areas.by_id.values():
+                if area['id'] != NO_AREA['id']:
+                    self._workspaces[(domain['id'], area['id'])] = EntityIndex(area.get('workspaces'))
+
+    def __len__(self):
+        return len(self.domains)
+
+    def areas(self, domain_id):
+        return self._areas.get(domain_id, EntityIndex([]))
+
+    def workspaces(self, domain_id, area_id):
+        return self._workspaces.get((domain_id, area_id), EntityIndex([]))
+
+
+def cached_index(store, key, build, ttl=None, version=None):
+    # Guarda el índice en store (p. ej. st.session_state) para no reconstruirlo en cada rerun.
+    # Se rehace cuando pasan ttl segundos (el mismo TTL que el cache de donde sale) o cuando
+    # cambia version (p. ej. cache.generation después de un cache.invalidate).
+    # Los índices vacíos (p. ej. si falló la API) no se guardan para reintentar en el próximo rerun
+    indices = store.setdefault('hierarchy_indices', {})
+    now = time.time()
+    entry = indices.get(key)
+    if entry is not None:
+        index, built_at, built_version = entry
+        if (ttl is None or now - built_at < ttl) and built_version == version:
+            return index
+        del indices[key]
+    index = build()
+    if len(index):
+        indices[key] = (index, now, version)
+    return index
@@ -31,6 +31,8 @@ translate_dict = {
     'include': {'en': 'Include', 'es': 'Incluir', 'pt': 'Incluir'}, 
     'language': {'en': 'Language', 'es': 'Idioma', 'pt': 'Idioma'}, 
     'logout': {'en': 'Logout', 'es': 'Cerrar Sesión', 'pt': 'Sair'}, 
+    'extracting_ndvi': {'en': 'Extracting NDVI', 'es': 'Extrayendo NDVI', 'pt': 'Extraindo NDVI'},
+    'failed_fields': {'en': 'Fields that could not be processed: ', 'es': 'Lotes que no se pudieron procesar: ', 'pt': 'Lotes que não puderam ser processados: '},
     'map_type_selector': {'en': 'Map type selector', 'es': 'Selector de tipo de mapa', 'pt': 'Seletor de tipo de mapa'}, 
     'metrics': {'en': 'Metrics', 'es': 'Métricas', 'pt': 'Métricas'}, 
     'only_no_date': {'en': 'Only Without Date', 'es': 'Solo Sin Fecha', 'pt': 'Somente Sem Data'}, 
@@ -1,31 +1,89 @@
-from datetime import datetime
+import os
+import time
+import random
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import ee
 import pandas as pd
 
-# Inicializar las fechas
-fecha_de_inicio = datetime(2024, 1, 1)
-fecha_de_finalizacion = datetime.now()
+from geometry import payload_sizes
+
+# Ventana por defecto cuando no hay campaña ni fecha de siembra. El fin se calcula
+# en cada pedido (no al importar) para que un proceso de larga vida no quede desfasado.
+DEFAULT_START_DATE = '2024-01-01'
+# Margen antes de la primera siembra (barbecho, preparación del lote)
+PRE_CROP_DAYS = 30
+# Duración máxima de la campaña desde la última siembra
+SEASON_DAYS = 365
+# Días de imágenes por pedido a Earth Engine (páginas de la extracción en lote)
+PAGE_DAYS = 90
+# Extracción concurrente: la respuesta de cada lote es un valor por imagen, así que aun con
+# varias órbitas por día una campaña entra en un pedido (se pagina solo con varios años)
+FIELD_PAGE_DAYS = 1000
 
-# Convertir las fechas al formato correcto
-START_DATE = fecha_de_inicio.strftime('%Y-%m-%d')
-END_DATE = fecha_de_finalizacion.strftime('%Y-%m-%d')
 CLOUD_FILTER = 60
 CLD_PRB_THRESH = 40
 NIR_DRK_THRESH = 0.15
 CLD_PRJ_DIST = 2
 BUFFER = 100
 
+# 'batch' (un reduceRegions por establecimiento) o 'concurrent' (un pedido por lote)
+EXTRACTION_MODE = os.environ.get('NDVI_EXTRACTION_MODE', 'batch')
+MAX_WORKERS = int(os.environ.get('NDVI_MAX_WORKERS', 8))
+FIELD_TIMEOUT = 300
+MAX_RETRIES = 5
+
+# Estrategia de máscara de nubes por defecto (ver MASK_STRATEGIES)
+MASK_STRATEGY = os.environ.get('NDVI_MASK_STRATEGY', 's2cloudless')
+# Clases SCL que se descartan: sombra de nube, nube media/alta probabilidad y cirros
+SCL_MASK_CLASSES = [3, 8, 9, 10]
+
+################################################################################
+# Ventanas de fechas
+################################################################################
+
+def date_window(start_date=None, end_date=None, today=None):
+    # filterDate excluye el fin, por eso la ventana por defecto llega hasta mañana
+    today = today or date.today()
+    start_date = start_date or DEFAULT_START_DATE
+    end_date = end_date or (today + timedelta(days=1)).isoformat()
+    return start_date, end_date
+
+def season_window(crop_dates, today=None):
+    # Desde PRE_CROP_DAYS antes de la primera siembra hasta SEASON_DAYS después de la
+    # última, sin pasar de hoy. Sin fechas de siembra válidas se usa la ventana por defecto.
+    dates = pd.to_datetime(pd.Series(crop_dates, dtype=object), errors='coerce', utc=True).dropna()
+    if dates.empty:
+        return date_window(today=today)
+
+    today = today or date.today()
+    start = dates.min().date() - timedelta(days=PRE_CROP_DAYS)
+    end = min(dates.max().date() + timedelta(days=SEASON_DAYS), today + timedelta(days=1))
+    return start.isoformat(), max(end, start + timedelta(days=1)).isoformat()
+
+def time_pages(start_date, end_date, days=PAGE_DAYS):
+    # Parte [start_date, end_date) en rangos consecutivos de hasta `days` días
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    while start < end:
+        page_end = min(start + timedelta(days=days), end)
+        yield start.isoformat(), page_end.isoformat()
+        start = page_end
+
 ################################################################################
 # Filtro de nubes
 ################################################################################
 
-def get_s2_sr_cld_col(aoi, start_date, end_date):
+def get_s2_sr_cld_col(aoi, start_date, end_date, join_cloudless=True):
     # Import and filter S2 SR.
     s2_sr_col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
         .filterBounds(aoi)
         .filterDate(start_date, end_date)
         .filter(ee.Filter.lte('CLOUDY_PIXEL_PERCENTAGE', CLOUD_FILTER)))
 
+    # La máscara SCL no necesita s2cloudless: se evita el join
+    if not join_cloudless:
+        return s2_sr_col
+
     # Import and filter s2cloudless.
     s2_cloudless_col = (ee.ImageCollection('COPERNICUS/S2_CLOUD_PROBABILITY')
         .filterBounds(aoi)
@@ -94,6 +152,16 @@ def add_cld_shdw_mask(img):
     # Add the final cloud-shadow mask to the image.
     return img.addBands(is_cld_shdw)
 
+def add_prob_mask(img):
+    # Solo nubes por probabilidad de s2cloudless, sin proyección de sombras ni buffer
+    cld_prb = ee.Image(img.get('s2cloudless')).select('probability')
+    return img.addBands(cld_prb.gt(CLD_PRB_THRESH).rename('cloudmask'))
+
+def add_scl_mask(img):
+    # Clasificación de escena de Sen2Cor incluida en la imagen SR (la opción más barata)
+    scl = img.select('SCL')
+    return img.addBands(scl.remap(SCL_MASK_CLASSES, [1] * len(SCL_MASK_CLASSES), 0).rename('cloudmask'))
+
 ################################################################################
 
 def apply_cld_shdw_mask(img):
@@ -103,20 +171,43 @@ def apply_cld_shdw_mask(img):
     # Subset reflectance bands and update their masks, return the result.
     return img.select('B.*').updateMask(not_cld_shdw)
 
-def extract_mean_ndvi_date(lote_gdf_filtrado):
+# estrategia -> (función que agrega la banda 'cloudmask', requiere el join con s2cloudless)
+MASK_STRATEGIES = {
+    's2cloudless': (add_cld_shdw_mask, True),
+    'probability': (add_prob_mask, True),
+    'scl': (add_scl_mask, False),
+}
+
+def get_masked_col(aoi, start_date, end_date, mask=MASK_STRATEGY):
+    if mask not in MASK_STRATEGIES:
+        raise ValueError(f'Unknown mask strategy {mask!r}, expected one of {sorted(MASK_STRATEGIES)}')
+    add_mask, join_cloudless = MASK_STRATEGIES[mask]
+    return (get_s2_sr_cld_col(aoi, start_date, end_date, join_cloudless)
+            .map(add_mask)
+            .map(apply_cld_shdw_mask))
+
+def check_deadline(deadline):
+    # deadline en time.monotonic(); se controla entre pedidos porque un getInfo en curso
+    # solo termina por el límite de ee_session.REQUEST_TIMEOUT
+    if deadline is not None and time.monotonic() >= deadline:
+        raise TimeoutError('Field deadline exceeded')
+
+def extract_mean_ndvi_date(lote_gdf_filtrado, start_date=None, end_date=None, mask=MASK_STRATEGY,
+                           ndvi_col=None, page_days=FIELD_PAGE_DAYS, deadline=None):
+    # ndvi_col: colección ya enmascarada (p. ej. la del establecimiento) para no
+    # repetir el join y la máscara en cada lote; si no se pasa se arma para el lote
+    start_date, end_date = date_window(start_date, end_date)
+    # Mismo presupuesto de GeoJSON que la extracción en lote (en modo concurrente el lote
+    # que lo supera queda como fallido sin llegar a Earth Engine)
+    check_payload(lote_gdf_filtrado)
     geom = lote_gdf_filtrado.geometry.iloc[0].__geo_interface__
     ee_geom = ee.Geometry(geom)
-    AOI = ee.Geometry(geom)
 
-    def add_ndvi(image):
-        image = image.clip(ee_geom)
-        ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
-        return image.addBands(ndvi)
+    if ndvi_col is None:
+        ndvi_col = get_ndvi_col(ee_geom, start_date, end_date, mask)
 
-    s2_sr_cld_col = get_s2_sr_cld_col(AOI, START_DATE, END_DATE)
-    s2_sr_cld_col = (s2_sr_cld_col.map(add_cld_shdw_mask)
-                                    .map(apply_cld_shdw_mask)
-                                    .map(add_ndvi))
+    # Sin clip: la geometría de reducción ya limita los píxeles del lote
+    s2_sr_cld_col = ndvi_col.filterBounds(ee_geom)
 
     def compute_mean(image):
         mean_value = image.reduceRegion(
@@ -129,10 +220,12 @@ def extract_mean_ndvi_date(lote_gdf_filtrado):
 
         return ee.Feature(None, {'date': image.date().format(), 'mean_ndvi': mean_value})
 
-    mean_features = s2_sr_cld_col.map(compute_mean)
-
-    # Convertir la colección de características a una lista y obtener la información.
-    info = mean_features.getInfo()['features']
+    # Un getInfo por lote (por página solo si la ventana supera FIELD_PAGE_DAYS)
+    info = []
+    for page_start, page_end in time_pages(start_date, end_date, page_days):
+        check_deadline(deadline)
+        mean_features = s2_sr_cld_col.filterDate(page_start, page_end).map(compute_mean)
+        info.extend(mean_features.getInfo()['features'])
 
     # Procesamiento final para crear el DataFrame
     records = [{
@@ -140,8 +233,231 @@ def extract_mean_ndvi_date(lote_gdf_filtrado):
         'Mean_NDVI': feature['properties']['mean_ndvi']
     } for feature in info if 'mean_ndvi' in feature['properties']]
 
-    df = pd.DataFrame(records)
+    return records_to_df(records, ['Date', 'Mean_NDVI'])
+
+def records_to_df(records, columns):
+    df = pd.DataFrame(records, columns=columns)
     df['Mean_NDVI'] = df['Mean_NDVI'].apply(lambda x: round(x, 3) if x else None)
     df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
-
     return df
+
+################################################################################
+# Errores de Earth Engine
+################################################################################
+
+def is_rate_limit_error(error):
+    message = str(error).lower()
+    return any(s in message for s in ('too many concurrent aggregations', '429', 'rate limit', 'quota exceeded'))
+
+def is_too_large_error(error):
+    # Solo errores de tamaño o memoria del pedido; "Too many concurrent aggregations"
+    # es de cuota y se resuelve esperando, no partiendo el bloque
+    if is_rate_limit_error(error):
+        return False
+    message = str(error).lower()
+    return any(s in message for s in ('memory limit', 'too large', 'payload size', 'accumulating over',
+                                      'too many elements', 'computation timed out'))
+
+def call_with_backoff(fn, max_retries=MAX_RETRIES, base_delay=1, deadline=None):
+    # Reintenta fn ante errores de cuota con espera exponencial y jitter, para no
+    # reintentar todos a la vez; deadline (time.monotonic()) corta las esperas
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except ee.EEException as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            delay = base_delay * 2 ** attempt + random.uniform(0, base_delay)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise TimeoutError('Field deadline exceeded') from e
+            time.sleep(delay)
+
+################################################################################
+# Extracción en lote (todos los lotes del establecimiento)
+################################################################################
+
+# getInfo() no devuelve colecciones de más de 5000 elementos
+MAX_FEATURES_PER_REQUEST = 5000
+# Presupuesto de GeoJSON por pedido (el límite de EE es de ~10 MB por request)
+MAX_PAYLOAD_BYTES = 4_000_000
+
+def get_ndvi_col(aoi, start_date=None, end_date=None, mask=MASK_STRATEGY):
+    start_date, end_date = date_window(start_date, end_date)
+
+    def add_ndvi(image):
+        ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
+        return image.addBands(ndvi)
+
+    return (get_masked_col(aoi, start_date, end_date, mask)
+            .map(add_ndvi)
+            .select('NDVI'))
+
+def gdf_to_feature_collection(gdf, field_col):
+    features = [ee.Feature(ee.Geometry(geom.__geo_interface__), {'field': name})
+                for name, geom in zip(gdf[field_col], gdf.geometry)]
+    return ee.FeatureCollection(features)
+
+def reduce_ndvi_regions(ndvi_col, fc):
+    def reduce_image(image):
+        date = image.date().format()
+        means = image.reduceRegions(collection=fc, reducer=ee.Reducer.mean(), scale=10)
+        # Se descarta la geometría para que la respuesta solo traiga los valores
+        return means.map(lambda f: ee.Feature(None, {
+            'field': f.get('field'),
+            'date': date,
+            'mean_ndvi': f.get('mean')
+        }))
+
+    return ndvi_col.map(reduce_image).flatten().filter(ee.Filter.notNull(['mean_ndvi']))
+
+def check_payload(gdf, max_bytes=MAX_PAYLOAD_BYTES):
+    # Tamaño del GeoJSON de cada lote; ningún lote solo puede pasar del presupuesto por pedido
+    sizes = payload_sizes(gdf.geometry.values)
+    if len(sizes) and sizes.max() > max_bytes:
+        name = gdf.index[sizes.argmax()]
+        raise ValueError(f'Field {name} geometry is {sizes.max()} bytes, over the {max_bytes} bytes budget; simplify it first')
+    return sizes
+
+def payload_chunks(gdf, chunk_size, max_bytes=MAX_PAYLOAD_BYTES):
+    # Bloques de hasta chunk_size lotes y max_bytes de geometrías
+    sizes = check_payload(gdf, max_bytes)
+
+    chunks, start, total = [], 0, 0
+    for i, size in enumerate(sizes):
+        if i > start and (i - start >= chunk_size or total + size > max_bytes):
+            chunks.append(gdf.iloc[start:i])
+            start, total = i, 0
+        total += size
+    if start < len(gdf):
+        chunks.append(gdf.iloc[start:])
+    return chunks
+
+def iter_ndvi_records(gdf, field_col, start_date=None, end_date=None, mask=MASK_STRATEGY, page_days=PAGE_DAYS):
+    # Genera un DataFrame largo [field_col, 'Date', 'Mean_NDVI'] por página (rango de
+    # fechas x bloque de lotes) a medida que llegan, así quien consume puede ir
+    # armando resultados sin esperar a la última respuesta
+    start_date, end_date = date_window(start_date, end_date)
+    if gdf.empty:
+        return
+
+    # Una sola colección para todo el establecimiento
+    farm_aoi = ee.Geometry(gdf.geometry.unary_union.envelope.__geo_interface__)
+    ndvi_col = get_ndvi_col(farm_aoi, start_date, end_date, mask)
+
+    # Fechas de todas las imágenes en un solo pedido; de ahí sale cuántas tiene cada página
+    # sin un size().getInfo() por página
+    timestamps = call_with_backoff(ndvi_col.aggregate_array('system:time_start').getInfo)
+    dates = pd.to_datetime(pd.Series(timestamps, dtype='int64'), unit='ms').dt.strftime('%Y-%m-%d')
+
+    for page_start, page_end in time_pages(start_date, end_date, page_days):
+        # Tamaño de bloque para no superar el límite de elementos por respuesta
+        n_images = int(((dates >= page_start) & (dates < page_end)).sum())
+        if not n_images:
+            continue
+        chunk_size = max(MAX_FEATURES_PER_REQUEST // n_images, 1)
+        page_col = ndvi_col.filterDate(page_start, page_end)
+
+        pending = payload_chunks(gdf, chunk_size)
+        while pending:
+            chunk = pending.pop(0)
+            fc = gdf_to_feature_collection(chunk, field_col)
+            try:
+                info = call_with_backoff(reduce_ndvi_regions(page_col, fc).getInfo)['features']
+            except ee.EEException as e:
+                # Si la respuesta es demasiado grande se parte el bloque en dos
+                if len(chunk) == 1 or not is_too_large_error(e):
+                    raise
+                half = len(chunk) // 2
+                pending[:0] = [chunk.iloc[:half], chunk.iloc[half:]]
+                continue
+
+            records = [{
+                field_col: feature['properties']['field'],
+                'Date': feature['properties']['date'],
+                'Mean_NDVI': feature['properties']['mean_ndvi']
+            } for feature in info]
+            yield records_to_df(records, [field_col, 'Date', 'Mean_NDVI'])
+
+def extract_mean_ndvi_batch(gdf, field_col, start_date=None, end_date=None, mask=MASK_STRATEGY, page_days=PAGE_DAYS):
+    pages = list(iter_ndvi_records(gdf, field_col, start_date, end_date, mask, page_days))
+    if not pages:
+        return pd.DataFrame(columns=[field_col, 'Date', 'Mean_NDVI'])
+    return pd.concat(pages, ignore_index=True)
+
+
+################################################################################
+# Extracción concurrente (un pedido por lote)
+################################################################################
+
+def extract_with_backoff(lote_gdf_filtrado, start_date, end_date, max_retries=MAX_RETRIES, base_delay=1,
+                         mask=MASK_STRATEGY, ndvi_col=None, deadline=None):
+    return call_with_backoff(
+        lambda: extract_mean_ndvi_date(lote_gdf_filtrado, start_date, end_date, mask, ndvi_col, deadline=deadline),
+        max_retries, base_delay, deadline)
+
+def iter_mean_ndvi_concurrent(gdf, field_col, start_date=None, end_date=None,
+                              max_workers=MAX_WORKERS, timeout=FIELD_TIMEOUT, max_retries=MAX_RETRIES,
+                              mask=MASK_STRATEGY):
+    # Genera (lote, df, error) a medida que termina cada lote, en orden de llegada;
+    # df es largo [field_col, 'Date', 'Mean_NDVI'] y es None si el lote falló
+    start_date, end_date = date_window(start_date, end_date)
+    names = list(gdf[field_col])
+    started = {}
+
+    # La colección enmascarada se arma una vez para todo el establecimiento y se
+    # comparte entre los lotes; cada uno solo agrega su filterBounds y su reducción
+    ndvi_col = None
+    if len(gdf):
+        farm_aoi = ee.Geometry(gdf.geometry.unary_union.envelope.__geo_interface__)
+        ndvi_col = get_ndvi_col(farm_aoi, start_date, end_date, mask)
+
+    def run(i):
+        # Con el plazo del lote el hilo deja de pedir páginas y reintentos cuando vence, así
+        # no queda ocupado y los lotes que esperan en la cola no se quedan sin tiempo
+        started[i] = time.monotonic()
+        return extract_with_backoff(gdf.iloc[[i]], start_date, end_date, max_retries, mask=mask, ndvi_col=ndvi_col,
+                                    deadline=started[i] + timeout)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(run, i): i for i in range(len(gdf))}
+
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    yield names[i], None, str(e)
+                    continue
+                df.insert(0, field_col, names[i])
+                yield names[i], df, None
+
+            # El lote vencido se informa sin esperar a que su getInfo en curso termine
+            # (termina solo por ee_session.REQUEST_TIMEOUT y el hilo ya no sigue)
+            now = time.monotonic()
+            for future in list(pending):
+                i = futures[future]
+                if i in started and now - started[i] > timeout:
+                    pending.discard(future)
+                    yield names[i], None, f'Timeout after {timeout} s'
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def extract_mean_ndvi_concurrent(gdf, field_col, start_date=None, end_date=None,
+                                 max_workers=MAX_WORKERS, timeout=FIELD_TIMEOUT, max_retries=MAX_RETRIES,
+                                 mask=MASK_STRATEGY):
+    results, failures = {}, {}
+    for name, df, error in iter_mean_ndvi_concurrent(gdf, field_col, start_date, end_date,
+                                                     max_workers, timeout, max_retries, mask):
+        if error is None:
+            results[name] = df
+        else:
+            failures[name] = error
+
+    # Resultados en el mismo orden que los lotes del GeoDataFrame
+    frames = [results[name] for name in gdf[field_col] if name in results]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[field_col, 'Date', 'Mean_NDVI'])
+    return df, failures
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from datetime import datetime, timedelta
+
+import pandas as pd
+import shapely
+
+import ndvi
+
+STORE_PATH = os.environ.get('NDVI_STORE_PATH', 'ndvi_store.sqlite')
+
+# Límite de filas (lote, fecha) antes de desalojar los lotes menos usados
+MAX_ROWS = 2_000_000
+
+# Sentinel-2 publica algunas imágenes con días de demora, por eso al
+# actualizar se vuelve a pedir este margen anterior a la última extracción
+REFRESH_DAYS = 5
+
+################################################################################
+# Claves
+################################################################################
+
+def mask_params(mask=ndvi.MASK_STRATEGY):
+    # Cada estrategia de máscara da series distintas, así que forma parte de la clave
+    return {
+        'MASK_STRATEGY': mask,
+        'CLOUD_FILTER': ndvi.CLOUD_FILTER,
+        'CLD_PRB_THRESH': ndvi.CLD_PRB_THRESH,
+        'NIR_DRK_THRESH': ndvi.NIR_DRK_THRESH,
+        'CLD_PRJ_DIST': ndvi.CLD_PRJ_DIST,
+        'BUFFER': ndvi.BUFFER,
+    }
+
+def field_key(geometry, params=None):
+    # La geometría se normaliza para que el orden de los vértices no cambie la clave
+    params = mask_params() if params is None else params
+    h = hashlib.sha1(shapely.normalize(geometry).wkb)
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+def fields_fingerprint(gdf, field_col, mask=ndvi.MASK_STRATEGY):
+    # Huella de un establecimiento: pares (nombre, clave) de sus lotes sin importar el orden y
+    # parámetros de máscara. Cambia si se edita un contorno, se renombra, agrega o quita un
+    # lote o cambia la máscara
+    params = mask_params(mask)
+    fields = sorted([str(name), field_key(geom, params)] for name, geom in zip(gdf[field_col], gdf.geometry))
+    return hashlib.sha1(json.dumps({'fields': fields, 'params': params}, sort_keys=True).encode()).hexdigest()
+
+################################################################################
+# Store en SQLite
+################################################################################
+
+class NDVIStore:
+    def __init__(self, path=STORE_PATH, max_rows=MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fields (
+                    key TEXT PRIMARY KEY,
+                    extracted_from TEXT NOT NULL,
+                    extracted_until TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS series (
+                    key TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    mean_ndvi REAL,
+                    PRIMARY KEY (key, date)
+                )''')
+            # Intervalos [start, end) ya extraídos de cada lote: las ventanas de campañas
+            # distintas pueden no tocarse, así que un solo intervalo por lote no alcanza.
+            # fields.extracted_from/extracted_until queda como la envolvente de todos
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS coverage (
+                    key TEXT NOT NULL,
+                    start TEXT NOT NULL,
+                    end TEXT NOT NULL,
+                    PRIMARY KEY (key, start)
+                )''')
+            # Stores anteriores: el intervalo único de cada lote pasa a coverage
+            conn.execute('''
+                INSERT OR IGNORE INTO coverage (key, start, end)
+                SELECT key, extracted_from, extracted_until FROM fields
+                WHERE key NOT IN (SELECT key FROM coverage)''')
+
+    def _connect(self):
+        # Una conexión por operación: el store se comparte entre sesiones y procesos
+        return sqlite3.connect(self.path, timeout=30)
+
+    def coverage(self, keys):
+        # Devuelve {key: [(start, end), ...]} ordenados y sin solaparse, de los lotes ya extraídos
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT key, start, end FROM coverage WHERE key IN ({placeholders}) ORDER BY key, start',
+                list(keys)).fetchall()
+        coverage = {}
+        for key, start, end in rows:
+            coverage.setdefault(key, []).append((start, end))
+        return coverage
+
+    def put(self, key, df, start_date, end_date):
+        # df con columnas 'Date' y 'Mean_NDVI' de un solo lote, extraído para [start_date, end_date).
+        # Reemplaza las fechas de ese rango y conserva las de otros rangos (otras campañas)
+        rows = df.groupby('Date')['Mean_NDVI'].mean().round(3)
+        rows = [(key, date, None if pd.isna(value) else float(value)) for date, value in rows.items()]
+
+        with self._connect() as conn:
+            conn.execute('DELETE FROM series WHERE key = ? AND date >= ? AND date < ?', (key, start_date, end_date))
+            conn.executemany('INSERT OR REPLACE INTO series (key, date, mean_ndvi) VALUES (?, ?, ?)', rows)
+
+            # Se une el rango nuevo con los que se solapan o tocan
+            touching = conn.execute('SELECT start, end FROM coverage WHERE key = ? AND start <= ? AND end >= ?',
+                                    (key, end_date, start_date)).fetchall()
+            start_date = min([start_date] + [t[0] for t in touching])
+            end_date = max([end_date] + [t[1] for t in touching])
+            conn.execute('DELETE FROM coverage WHERE key = ? AND start <= ? AND end >= ?', (key, end_date, start_date))
+            conn.execute('INSERT INTO coverage (key, start, end) VALUES (?, ?, ?)', (key, start_date, end_date))
+
+            hull = conn.execute('SELECT MIN(start), MAX(end) FROM coverage WHERE key = ?', (key,)).fetchone()
+            conn.execute('INSERT OR REPLACE INTO fields (key, extracted_from, extracted_until, last_access) VALUES (?, ?, ?, ?)',
+                         (key, hull[0], hull[1], time.time()))
+
+    def get(self, keys, start_date, end_date):
+        if not keys:
+            return pd.DataFrame(columns=['key', 'Date', 'Mean_NDVI'])
+        placeholders = ','.join('?' * len(keys))
+        with self._connect() as conn:
+            conn.execute(f'UPDATE fields SET last_access = ? WHERE key IN ({placeholders})', [time.time(), *keys])
+            rows = conn.execute(
+                f'SELECT key, date, mean_ndvi FROM series WHERE key IN ({placeholders}) AND date >= ? AND date < ? ORDER BY date',
+                [*keys, start_date, end_date]).fetchall()
+        return pd.DataFrame(rows, columns=['key', 'Date', 'Mean_NDVI'])
+
+    def evict(self):
+        # Desaloja los lotes con acceso más antiguo hasta quedar debajo de max_rows
+        with self._connect() as conn:
+            total = conn.execute('SELECT COUNT(*) FROM series').fetchone()[0]
+            if total <= self.max_rows:
+                return 0
+
+            sizes = conn.execute('''
+                SELECT f.key, COUNT(s.date) FROM fields f
+                LEFT JOIN series s ON s.key = f.key
+                GROUP BY f.key ORDER BY f.last_access''').fetchall()
+
+            evicted = []
+            for key, size in sizes:
+                if total <= self.max_rows:
+                    break
+                evicted.append((key,))
+                total -= size
+
+            conn.executemany('DELETE FROM series WHERE key = ?', evicted)
+            conn.executemany('DELETE FROM coverage WHERE key = ?', evicted)
+            conn.executemany('DELETE FROM fields WHERE key = ?', evicted)
+        return len(evicted)
+
+################################################################################
+# Extracción incremental
+################################################################################
+
+def shift_date(date, days):
+    return (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=days)).strftime('%Y-%m-%d')
+
+def date_fraction(date, start_date, end_date):
+    # Proporción de la ventana [start_date, end_date) cubierta hasta date
+    start, end = (datetime.strptime(d, '%Y-%m-%d') for d in (start_date, end_date))
+    current = datetime.strptime(date, '%Y-%m-%d')
+    return min(max((current - start) / (end - start), 0.0), 1.0) if end > start else 1.0
+
+def missing_ranges(intervals, start_date, end_date, refresh_days=REFRESH_DAYS):
+    # Rangos de [start_date, end_date) que no cubren los intervalos ya extraídos (ordenados).
+    # Un rango que sigue a uno extraído se pide desde refresh_days antes de donde terminó
+    ranges = []
+    cursor, previous_start = start_date, None
+    for start, end in intervals:
+        if end <= cursor:
+            continue
+        if start >= end_date:
+            break
+        if start > cursor:
+            ranges.append((cursor, start, previous_start))
+        cursor, previous_start = max(cursor, end), start
+    if cursor < end_date:
+        ranges.append((cursor, end_date, previous_start))
+
+    return [(r_start if covered_start is None else max(start_date, covered_start, shift_date(r_start, -refresh_days)), r_end)
+            for r_start, r_end, covered_start in ranges]
+
+def iter_mean_ndvi_cached(gdf, field_col, store=None, start_date=None, end_date=None,
+                          mode=ndvi.EXTRACTION_MODE, mask=ndvi.MASK_STRATEGY):
+    # Genera (df, avance, fallidos) a medida que hay resultados: primero lo que ya está
+    # en el store y después cada página que llega de Earth Engine. df es largo
+    # [field_col, 'Date', 'Mean_NDVI'], sin fechas repetidas entre páginas; avance va de 0 a 1.
+    # La ventana (p. ej. ndvi.season_window) define qué fechas se piden y se devuelven
+    start_date, end_date = ndvi.date_window(start_date, end_date)
+    store = NDVIStore() if store is None else store
+    failures = {}
+
+    params = mask_params(mask)
+    keys = [field_key(geom, params) for geom in gdf.geometry]
+    names = dict(zip(keys, gdf[field_col]))
+    coverage = store.coverage(keys)
+
+    # Rangos que hay que pedir a Earth Engine para cada lote (solo lo que falta)
+    pending = pd.DataFrame([
+        {'index': index, 'key': key, 'fetch_from': r_start, 'fetch_until': r_end}
+        for index, key in zip(gdf.index, keys)
+        for r_start, r_end in missing_ranges(coverage.get(key, []), start_date, end_date)
+    ], columns=['index', 'key', 'fetch_from', 'fetch_until'])
+
+    # Lo guardado, sin las fechas que se vuelven a pedir
+    stored = store.get(keys, start_date, end_date)
+    refetched = pd.Series(False, index=stored.index)
+    for (r_start, r_end), group in pending.groupby(['fetch_from', 'fetch_until']):
+        refetched |= stored['key'].isin(group['key']) & (stored['Date'] >= r_start) & (stored['Date'] < r_end)
+    stored = stored[~refetched].reset_index(drop=True)
+    stored.insert(0, field_col, stored.pop('key').map(names))
+
+    # Avance: cada lote completo cuenta uno y cada rango pendiente de un lote, otro
+    pending_keys = set(pending['key'])
+    done = sum(key not in pending_keys for key in keys)
+    total = done + len(pending)
+    yield stored, done / total if total else 1.0, failures
+
+    # Los lotes con el mismo rango pendiente se extraen juntos
+    for (fetch_start, fetch_end), group in pending.groupby(['fetch_from', 'fetch_until']):
+        sub_gdf = gdf.loc[group['index']]
+        frames = []
+        if mode == 'concurrent':
+            # Un resultado por lote a medida que termina cada uno
+            finished = 0
+            for name, df, error in ndvi.iter_mean_ndvi_concurrent(sub_gdf, field_col, fetch_start, fetch_end, mask=mask):
+                finished += 1
+                if error is not None:
+                    failures[name] = error
+                    df = pd.DataFrame(columns=[field_col, 'Date', 'Mean_NDVI'])
+                frames.append(df)
+                yield df, (done + finished) / total, failures
+        else:
+            covered = 0.0
+            for df in ndvi.iter_ndvi_records(sub_gdf, field_col, fetch_start, fetch_end, mask):
+                frames.append(df)
+                if len(df):
+                    covered = max(covered, date_fraction(df['Date'].max(), fetch_start, fetch_end))
+                yield df, (done + covered * len(group)) / total, failures
+
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[field_col, 'Date', 'Mean_NDVI'])
+        by_field = dict(tuple(df.groupby(field_col)))
+        empty = pd.DataFrame(columns=['Date', 'Mean_NDVI'])
+
+        for name, key in zip(sub_gdf[field_col], group['key']):
+            # Los lotes que fallaron no se guardan para que se vuelvan a pedir
+            if name in failures:
+                continue
+            store.put(key, by_field.get(name, empty), fetch_start, fetch_end)
+
+        done += len(group)
+        yield df.iloc[:0], done / total, failures
+
+    store.evict()
+
+def extract_mean_ndvi_cached(gdf, field_col, store=None, start_date=None, end_date=None,
+                             mode=ndvi.EXTRACTION_MODE, mask=ndvi.MASK_STRATEGY):
+    start_date, end_date = ndvi.date_window(start_date, end_date)
+    store = NDVIStore() if store is None else store
+
+    failures = {}
+    for _, _, failures in iter_mean_ndvi_cached(gdf, field_col, store, start_date, end_date, mode, mask):
+        pass
+
+    # Resultado final desde el store: una fila por lote y fecha, ordenado por fecha
+    params = mask_params(mask)
+    keys = [field_key(geom, params) for geom in gdf.geometry]
+    df = store.get(keys, start_date, end_date)
+    df.insert(0, field_col, df.pop('key').map(dict(zip(keys, gdf[field_col]))))
+
+    return df, failures
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ndvi
+import ee_session
+from helper import translate, farms
+from async_api import fields_for_farms
+from secretManager import get_secret
+from fields import prepare_fields
+from ndvi_store import NDVIStore, extract_mean_ndvi_cached, fields_fingerprint
+from results_store import ResultsStore
+
+################################################################################
+# Precálculo de series NDVI por workspace/campaña
+################################################################################
+
+# Uso:
+#   python precompute.py --domain 1 --workspace 1757 --season 2588
+#   python precompute.py --domain 1 --workspace 1757 --season 2588 --farm 13510 --workers 4
+#
+# Escribe en los mismos stores que lee la app: las series por lote (NDVI_STORE_PATH) y
+# el resultado de cada establecimiento en Parquet (NDVI_RESULTS_PATH), así el primer
+# usuario del día lo lee de un archivo sin pasar por Earth Engine.
+# Cada establecimiento terminado se registra en el log de avance; si el proceso se
+# corta, al volver a correrlo se saltean los que ya se completaron en el día.
+
+PROGRESS_LOG = os.environ.get('PRECOMPUTE_LOG', 'precompute_log.jsonl')
+# Establecimientos procesados en paralelo (cada uno ya hace sus propios pedidos a EE)
+FARM_WORKERS = 2
+
+API_SECRETS = {
+    'test': 'test/apigraphql360',
+    'prod': 'prod/apigraphql360-v2',
+}
+
+def api_credentials(env):
+    secrets = json.loads(get_secret(secret_name=API_SECRETS[env], region_name="us-west-2"))
+    return secrets['x-api-key'], secrets['url']
+
+class ProgressLog:
+    # Log JSONL de avance: una línea por establecimiento terminado o fallido
+    def __init__(self, path=PROGRESS_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def completed(self, workspace, season, day):
+        if not os.path.exists(self.path):
+            return set()
+        done = set()
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Última línea cortada si el proceso se interrumpió al escribir
+                    continue
+                if (entry.get('status') == 'done' and entry.get('workspace') == workspace
+                        and entry.get('season') == season and entry.get('day') == day):
+                    done.add(entry['farm'])
+        return done
+
+    def write(self, **entry):
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+def precompute_farm(fields_df, domain, farm, season, lang, store, results, mode, mask):
+    field_col = translate("field", lang)
+    gdf_ee, (start_date, end_date), report = prepare_fields(fields_df, field_col)
+    if gdf_ee.empty:
+        # Todos los lotes sin hectáreas: no hay nada que extraer
+        return {'fields': 0, 'rows': 0}
+    df, failures = extract_mean_ndvi_cached(gdf_ee, field_col, store, start_date, end_date, mode, mask)
+    # Igual que la app: con lotes fallidos no se guarda el resultado del establecimiento
+    if not failures:
+        results.write(domain, farm, season, df, field_col, start_date, end_date,
+                      fields_fingerprint(gdf_ee, field_col, mask))
+    return {
+        'fields': len(gdf_ee),
+        'rows': len(df),
+        'window': [start_date, end_date],
+        'failed_fields': sorted(failures),
+        'vertices': report['vertices_after'],
+    }
+
+def precompute(domain, workspace, season, access_key_id, url, farm_ids=None, lang='es', workers=FARM_WORKERS,
+               mode=ndvi.EXTRACTION_MODE, mask=ndvi.MASK_STRATEGY, log=None, force=False, store=None, results=None):
+    log = ProgressLog() if log is None else log
+    store = NDVIStore() if store is None else store
+    results = ResultsStore() if results is None else results
+    day = date.today().isoformat()
+
+    if farm_ids is None:
+        farm_list = farms(workspace, season, access_key_id, url)
+        if farm_list is None:
+            raise RuntimeError(f'Could not list farms of workspace {workspace}, season {season}')
+        farm_ids = [f['id'] for f in farm_list if not f.get('deleted')]
+
+    done = set() if force else log.completed(workspace, season, day)
+    pending = [farm for farm in farm_ids if farm not in done]
+    logging.info(f'{len(farm_ids)} farms, {len(farm_ids) - len(pending)} already done today, {len(pending)} pending')
+
+    # Los lotes de todos los establecimientos pendientes se piden en paralelo a la API.
+    # Un establecimiento que falla queda en None y se registra como 'failed' sin cortar
+    # a los demás; si falla el pedido completo, fallan todos en el log
+    try:
+        fields = fields_for_farms(season, pending, lang, access_key_id, url)
+        fetch_error = 'fields API call failed'
+    except Exception as e:
+        fields = {}
+        fetch_error = f'fields API call failed ({e})'
+        logging.error(f'Could not fetch the fields of {len(pending)} farms: {e}')
+
+    def run(farm):
+        start = time.monotonic()
+        fields_df = fields.get(farm)
+        if fields_df is None:
+            raise RuntimeError(fetch_error)
+        if fields_df.empty:
+            return {'fields': 0, 'rows': 0}, time.monotonic() - start
+        result = precompute_farm(fields_df, domain, farm, season, lang, store, results, mode, mask)
+        return result, time.monotonic() - start
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, farm): farm for farm in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            farm = futures[future]
+            entry = {'workspace': workspace, 'season': season, 'farm': farm, 'day': day}
+            try:
+                result, seconds = future.result()
+            except Exception as e:
+                failed.append(farm)
+                log.write(**entry, status='failed', error=str(e))
+                logging.error(f'[{i}/{len(pending)}] farm {farm}: failed ({e})')
+                continue
+            # Los establecimientos con lotes fallidos quedan 'partial' y se reintentan
+            status = 'partial' if result.get('failed_fields') else 'done'
+            log.write(**entry, status=status, seconds=round(seconds, 1), **result)
+            logging.info(f"[{i}/{len(pending)}] farm {farm}: {result['fields']} fields, {result['rows']} rows in {seconds:.1f} s")
+
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute NDVI series for every farm of a workspace/season.')
+    parser.add_argument('--domain', type=int, required=True)
+    parser.add_argument('--workspace', type=int, required=True)
+    parser.add_argument('--season', type=int, required=True)
+    parser.add_argument('--farm', type=int, action='append', help='only these farms (repeatable)')
+    parser.add_argument('--env', choices=sorted(API_SECRETS), default='prod')
+    parser.add_argument('--lang', default='es')
+    parser.add_argument('--workers', type=int, default=FARM_WORKERS, help='farms processed in parallel')
+    parser.add_argument('--mode', choices=['batch', 'concurrent'], default=ndvi.EXTRACTION_MODE)
+    parser.add_argument('--mask', choices=sorted(ndvi.MASK_STRATEGIES), default=ndvi.MASK_STRATEGY)
+    parser.add_argument('--log', default=PROGRESS_LOG, help='JSONL progress log used to resume')
+    parser.add_argument('--force', action='store_true', help='ignore farms already done today')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    access_key_id, url = api_credentials(args.env)
+    ee_session.initialize()
+
+    failed = precompute(args.domain, args.workspace, args.season, access_key_id, url, args.farm, args.lang, args.workers,
+                        args.mode, args.mask, ProgressLog(args.log), args.force)
+    if failed:
+        logging.error(f'{len(failed)} farms failed: {failed}')
+    raise SystemExit(1 if failed else 0)
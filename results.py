@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+################################################################################
+# Acumulador de resultados NDVI
+################################################################################
+
+class NDVIAccumulator:
+    # Junta los resultados por lote en una lista y arma la tabla una sola vez al
+    # final, en lugar de concatenar y pivotear en cada iteración (O(n²) en lotes)
+
+    def __init__(self, field_col):
+        self.field_col = field_col
+        self._frames = []
+        # Columnas de los lotes agregados con add(), se convierten en frame al final
+        self._names = []
+        self._dates = []
+        self._values = []
+
+    def __len__(self):
+        return sum(len(df) for df in self._frames) + sum(len(d) for d in self._dates)
+
+    def add(self, field_name, df):
+        # df con columnas 'Date' y 'Mean_NDVI' de un solo lote
+        self._names.append((field_name, len(df)))
+        self._dates.append(df['Date'].to_numpy())
+        self._values.append(df['Mean_NDVI'].to_numpy(dtype='float64', na_value=np.nan))
+
+    def add_long(self, df):
+        # df con columnas field_col, 'Date' y 'Mean_NDVI' de uno o varios lotes
+        self._frames.append(df[[self.field_col, 'Date', 'Mean_NDVI']])
+
+    def _flush(self):
+        if not self._names:
+            return
+        names, sizes = zip(*self._names)
+        self._frames.append(pd.DataFrame({
+            self.field_col: np.repeat(np.array(names, dtype=object), sizes),
+            'Date': np.concatenate(self._dates),
+            'Mean_NDVI': np.concatenate(self._values),
+        }))
+        self._names, self._dates, self._values = [], [], []
+
+    def to_long(self):
+        self._flush()
+        if not self._frames:
+            return pd.DataFrame(columns=[self.field_col, 'Date', 'Mean_NDVI'])
+        df = pd.concat(self._frames, ignore_index=True)
+        # Se deja un solo frame para que las próximas llamadas no vuelvan a concatenar
+        self._frames = [df]
+        return df
+
+    def to_wide(self):
+        # Matriz Fecha x Lote, con la fecha como columna igual que pivot_table().reset_index()
+        df = self.to_long()
+        df = df.astype({'Mean_NDVI': 'float64'})
+        wide = df.groupby(['Date', self.field_col])['Mean_NDVI'].mean().unstack(self.field_col)
+        # Igual que pivot_table, se descartan las fechas y los lotes sin ningún valor
+        wide = wide.dropna(axis=0, how='all').dropna(axis=1, how='all')
+        wide.columns.name = self.field_col
+        return wide.reset_index()
@@ -0,0 +1,129 @@
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+RESULTS_PATH = os.environ.get('NDVI_RESULTS_PATH', 'ndvi_results')
+
+# Esquema compacto: nombres de lote como diccionario, fecha como timestamp y NDVI en float32
+SCHEMA = pa.schema([
+    ('field', pa.dictionary(pa.int32(), pa.string())),
+    ('date', pa.timestamp('ms')),
+    ('mean_ndvi', pa.float32()),
+])
+PARTITIONING = ds.partitioning(pa.schema([
+    ('domain', pa.int64()),
+    ('farm', pa.int64()),
+    ('season', pa.int64()),
+]), flavor='hive')
+
+################################################################################
+# Store columnar de resultados: una partición Parquet por dominio/establecimiento/campaña
+################################################################################
+
+class ResultsStore:
+    # Series NDVI finales por establecimiento. El store de SQLite (ndvi_store.py) es el
+    # cache incremental por lote; este guarda el resultado armado para leerlo de un archivo.
+
+    def __init__(self, path=RESULTS_PATH):
+        self.path = path
+
+    def partition(self, domain, farm, season):
+        return os.path.join(self.path, f'domain={domain}', f'farm={farm}', f'season={season}')
+
+    def _file(self, domain, farm, season):
+        return os.path.join(self.partition(domain, farm, season), 'part-0.parquet')
+
+    def write(self, domain, farm, season, df, field_col, start_date, end_date, fingerprint=None):
+        # df largo [field_col, 'Date', 'Mean_NDVI']; reemplaza la partición completa.
+        # fingerprint (ndvi_store.fields_fingerprint) identifica los lotes y la máscara usados.
+        # Una fila por lote y fecha (promedio si la fecha tiene varias imágenes), ordenadas
+        # por lote y fecha para que las estadísticas de los row groups sirvan a los filtros
+        df = df.astype({'Mean_NDVI': 'float64'}).groupby([field_col, 'Date'], as_index=False)['Mean_NDVI'].mean()
+        table = pa.table({
+            'field': pa.array(df[field_col].astype(str).to_numpy()).dictionary_encode(),
+            'date': pa.array(pd.to_datetime(df['Date']).to_numpy(dtype='datetime64[ms]')),
+            'mean_ndvi': pa.array(df['Mean_NDVI'].to_numpy(dtype='float32', na_value=float('nan')), from_pandas=True),
+        }, schema=SCHEMA)
+        metadata = {'start_date': start_date, 'end_date': end_date}
+        if fingerprint is not None:
+            metadata['fingerprint'] = fingerprint
+        table = table.replace_schema_metadata(metadata)
+
+        # Se escribe a un temporal y se renombra para que un lector nunca vea un archivo a
+        # medias (el prefijo '.' hace que ds.dataset lo ignore mientras tanto)
+        partition = self.partition(domain, farm, season)
+        os.makedirs(partition, exist_ok=True)
+        path = self._file(domain, farm, season)
+        tmp = os.path.join(partition, f'.{uuid.uuid4().hex}.tmp')
+        pq.write_table(table, tmp, compression='zstd')
+        os.replace(tmp, path)
+
+    def _metadata(self, domain, farm, season):
+        # Metadatos del esquema de la partición ({} si no existe). Solo lee el footer.
+        path = self._file(domain, farm, season)
+        if not os.path.exists(path):
+            return {}
+        metadata = pq.read_schema(path, memory_map=True).metadata or {}
+        return {k.decode(): v.decode() for k, v in metadata.items()}
+
+    def window(self, domain, farm, season):
+        # (start_date, end_date) con que se escribió la partición, o None
+        metadata = self._metadata(domain, farm, season)
+        if 'start_date' not in metadata:
+            return None
+        return metadata['start_date'], metadata['end_date']
+
+    def is_current(self, domain, farm, season, start_date, end_date, fingerprint):
+        # La partición sirve solo si se escribió con la misma ventana y los mismos lotes y
+        # máscara: la ventana de una campaña pasada no cambia aunque se editen los contornos
+        metadata = self._metadata(domain, farm, season)
+        return (metadata.get('start_date') == start_date and metadata.get('end_date') == end_date
+                and metadata.get('fingerprint') == fingerprint)
+
+    def read(self, domain, farm, season, field_col, start_date=None, end_date=None, fields=None):
+        # Lectura de un establecimiento con memory map y filtros empujados al lector de Parquet
+        path = self._file(domain, farm, season)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=[field_col, 'Date', 'Mean_NDVI'])
+
+        table = pq.read_table(path, memory_map=True, filters=self._filters(start_date, end_date, fields) or None)
+        df = table.to_pandas()
+        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+        df['field'] = df['field'].astype(str)
+        # float32 en disco; se redondea a los 3 decimales con que se extrae
+        df['mean_ndvi'] = df['mean_ndvi'].astype('float64').round(3)
+        return df.rename(columns={'field': field_col, 'date': 'Date', 'mean_ndvi': 'Mean_NDVI'})
+
+    def scan(self, columns=None, domain=None, farm=None, season=None, start_date=None, end_date=None, fields=None):
+        # Consultas sobre muchos establecimientos: devuelve RecordBatches de a uno, así no se
+        # carga todo en memoria. Los filtros de partición descartan directorios enteros.
+        if not os.path.isdir(self.path):
+            return iter(())
+        dataset = ds.dataset(self.path, format='parquet', partitioning=PARTITIONING)
+
+        expression = None
+        for name, value in (('domain', domain), ('farm', farm), ('season', season)):
+            if value is not None:
+                term = ds.field(name).isin(value) if isinstance(value, (list, tuple, set)) else ds.field(name) == value
+                expression = term if expression is None else expression & term
+        filters = self._filters(start_date, end_date, fields)
+        if filters:
+            term = pq.filters_to_expression(filters)
+            expression = term if expression is None else expression & term
+
+        return dataset.to_batches(columns=columns, filter=expression)
+
+    @staticmethod
+    def _filters(start_date, end_date, fields):
+        filters = []
+        if start_date is not None:
+            filters.append(('date', '>=', pd.Timestamp(start_date)))
+        if end_date is not None:
+            filters.append(('date', '<', pd.Timestamp(end_date)))
+        if fields is not None:
+            filters.append(('field', 'in', list(fields)))
+        return filters
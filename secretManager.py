@@ -1,16 +1,36 @@
+import os
+import json
+import time
+import threading
 import boto3
 import base64
 from botocore.exceptions import ClientError
 
+# Segundos que un secreto se mantiene en memoria y margen antes de vencer en el
+# que se refresca en segundo plano (las sesiones siguen usando el valor vigente)
+SECRET_TTL = int(os.environ.get('SECRET_TTL', 300))
+SECRET_REFRESH_MARGIN = 60
+
 
 class AWSSecret:
+    # Un cliente de Secrets Manager por región para todo el proceso
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, region_name):
+        with cls._clients_lock:
+            if region_name not in cls._clients:
+                session = boto3.session.Session()
+                cls._clients[region_name] = session.client(service_name='secretsmanager',
+                    region_name=region_name
+                )
+            return cls._clients[region_name]
+
     def get_secret(self, secret_name, region_name): 
         secret = None
-        # Create a Secrets Manager client
-        session = boto3.session.Session()
-        client = session.client(service_name='secretsmanager',
-            region_name=region_name
-        )
+        # Reuse the Secrets Manager client of the region
+        client = self.get_client(region_name)
         # In this sample we only handle the specific exceptions for the 'GetSecretValue' API.
         # See https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_GetSecretValue.html
         # We rethrow the exception by default.
@@ -39,6 +59,9 @@ class AWSSecret:
                 # We can't find the resource that you asked for.
                 # Deal with the exception here, and/or rethrow at your discretion.
                 raise e
+            else:
+                # Any other code (AccessDenied, throttling...): rethrow instead of returning None
+                raise e
         else:
              # Decrypts secret using the associated KMS CMK.
             # Depending on whether the secret is a string or binary, one of these fields will be populated.
@@ -47,4 +70,102 @@ class AWSSecret:
             else:
                 decoded_binary_secret = base64.b64decode(get_secret_value_response['SecretBinary'])     
         # Your code goes here. 
-        return secret
\ No newline at end of file
+        return secret
+
+
+class EnvSecret:
+    # Secretos locales para correr sin AWS: primero la variable de entorno
+    # SECRET_<NOMBRE> (p. ej. prod/streamlit/gee -> SECRET_PROD_STREAMLIT_GEE) y si
+    # no existe, el archivo JSON indicado en SECRETS_FILE ({nombre: valor})
+    def __init__(self, secrets_file=None):
+        self.secrets_file = secrets_file or os.environ.get('SECRETS_FILE')
+
+    def get_secret(self, secret_name, region_name):
+        env_name = 'SECRET_' + ''.join(c if c.isalnum() else '_' for c in secret_name).upper()
+        if env_name in os.environ:
+            return os.environ[env_name]
+
+        if self.secrets_file:
+            with open(self.secrets_file) as f:
+                secrets = json.load(f)
+            if secret_name in secrets:
+                secret = secrets[secret_name]
+                return secret if isinstance(secret, str) else json.dumps(secret)
+
+        raise KeyError(f'Secret {secret_name} not found in {env_name} or SECRETS_FILE')
+
+
+class SecretProvider:
+    def __init__(self, backend, ttl=SECRET_TTL, refresh_margin=SECRET_REFRESH_MARGIN):
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl)
+        self._cache = {}  # (secret_name, region_name) -> (secret, fetched_at)
+        self._locks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fetch(self, key):
+        secret = self.backend.get_secret(secret_name=key[0], region_name=key[1])
+        if secret is None:
+            # Un None no se cachea: todas las sesiones lo recibirían hasta que venza el TTL
+            raise KeyError(f'Secret {key[0]} returned no value')
+        self._cache[key] = (secret, time.monotonic())
+        return secret
+
+    def _refresh(self, key):
+        try:
+            with self._key_lock(key):
+                self._fetch(key)
+        except Exception:
+            # Si el refresco falla se sigue usando el valor vigente hasta que venza
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_secret(self, secret_name, region_name):
+        key = (secret_name, region_name)
+        cached = self._cache.get(key)
+
+        if cached is not None:
+            age = time.monotonic() - cached[1]
+            if age < self.ttl - self.refresh_margin:
+                return cached[0]
+            if age < self.ttl:
+                # Cerca de vencer: se devuelve el valor vigente y se refresca en segundo plano
+                with self._lock:
+                    start = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start:
+                    threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+                return cached[0]
+
+        # Vencido o ausente: una sola sesión lo busca y las demás esperan ese resultado
+        with self._key_lock(key):
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.ttl:
+                return cached[0]
+            return self._fetch(key)
+
+    def invalidate(self, secret_name=None, region_name=None):
+        for key in list(self._cache):
+            if secret_name in (None, key[0]) and region_name in (None, key[1]):
+                self._cache.pop(key, None)
+
+
+BACKENDS = {
+    'aws': AWSSecret,
+    'env': EnvSecret,
+}
+
+# Proveedor compartido por todo el proceso; SECRETS_BACKEND=env para usar secretos locales
+provider = SecretProvider(BACKENDS[os.environ.get('SECRETS_BACKEND', 'aws')]())
+
+
+def get_secret(secret_name, region_name):
+    return provider.get_secret(secret_name, region_name)
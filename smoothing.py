@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from scipy.signal import savgol_filter
+from scipy.interpolate import RBFInterpolator
+
+# 'whittaker', 'savgol' o 'rbf' (el thin plate spline por lote que se usaba antes)
+SMOOTHING_METHOD = 'whittaker'
+
+# Parámetros sobre una grilla diaria
+WHITTAKER_LAMBDA = 1000
+SAVGOL_WINDOW = 31
+SAVGOL_POLYORDER = 2
+
+################################################################################
+# Utilidades
+################################################################################
+
+def daily_grid(pivot_df, date_col='Date'):
+    # Pasa la matriz Fecha x Lote a una grilla diaria (las fechas sin imagen quedan en NaN)
+    df = pivot_df.drop(columns=['DateNum'], errors='ignore').copy()
+    df[date_col] = pd.to_datetime(df[date_col])
+    df = df.groupby(date_col).mean()
+    days = pd.date_range(df.index.min(), df.index.max(), freq='D')
+    return df.reindex(days)
+
+def fill_short_columns(y, smoothed, min_points):
+    # Los lotes con pocos datos no se suavizan: un valor constante o NaN si no hay ninguno
+    counts = np.isfinite(y).sum(axis=0)
+    short = counts < min_points
+    if short.any():
+        means = np.nanmean(np.where(counts[short] > 0, y[:, short], 0), axis=0)
+        smoothed[:, short] = np.where(counts[short] > 0, means, np.nan)
+    return smoothed, ~short
+
+################################################################################
+# Suavizadores (todas las columnas a la vez)
+################################################################################
+
+def whittaker(y, lam=WHITTAKER_LAMBDA):
+    # Whittaker de segundo orden con pesos 0 en los NaN. Se arma un único sistema
+    # disperso en bloques (un bloque pentadiagonal por lote) y se resuelve una vez.
+    n, m = y.shape
+    smoothed = np.full_like(y, np.nan, dtype='float64')
+    if n < 3:
+        return fill_short_columns(y, smoothed, n + 1)[0]
+
+    smoothed, ok = fill_short_columns(y, smoothed, 2)
+    if not ok.any():
+        return smoothed
+
+    y_ok = y[:, ok]
+    w = np.isfinite(y_ok).astype('float64')
+    d = sparse.diags([1.0, -2.0, 1.0], [0, 1, 2], shape=(n - 2, n))
+    penalty = lam * (d.T @ d)
+
+    a = sparse.kron(sparse.identity(ok.sum()), penalty) + sparse.diags(w.ravel(order='F'))
+    b = (w * np.nan_to_num(y_ok)).ravel(order='F')
+    z = splu(a.tocsc(), permc_spec='NATURAL').solve(b)
+
+    smoothed[:, ok] = z.reshape((n, -1), order='F')
+    return smoothed
+
+def savgol(y, window=SAVGOL_WINDOW, polyorder=SAVGOL_POLYORDER):
+    # Se completan los huecos por interpolación lineal y se filtra todo de una vez
+    n = y.shape[0]
+    filled = pd.DataFrame(y).interpolate(limit_direction='both').to_numpy()
+    # Solo quedan NaN en los lotes sin datos, que después se reemplazan
+    filled = np.nan_to_num(filled)
+    window = min(window, n if n % 2 else n - 1)
+    if window <= polyorder:
+        smoothed = filled
+    else:
+        smoothed = savgol_filter(filled, window, polyorder, axis=0, mode='interp')
+    return fill_short_columns(y, smoothed, 2)[0]
+
+def rbf(y, kernel='thin_plate_spline'):
+    # Un RBFInterpolator por lote, como en la versión original de app.py
+    x = np.arange(y.shape[0], dtype='float64')[:, None]
+    smoothed = np.full_like(y, np.nan, dtype='float64')
+    smoothed, ok = fill_short_columns(y, smoothed, 2)
+    for j in np.flatnonzero(ok):
+        valid = np.isfinite(y[:, j])
+        smoothed[:, j] = RBFInterpolator(x[valid], y[valid, j], kernel=kernel)(x)
+    return smoothed
+
+SMOOTHERS = {
+    'whittaker': whittaker,
+    'savgol': savgol,
+    'rbf': rbf,
+}
+
+def smooth_ndvi(pivot_df, method=SMOOTHING_METHOD, date_col='Date', **kwargs):
+    # Devuelve la serie suavizada de cada lote en las mismas fechas de pivot_df
+    if pivot_df.empty:
+        return pivot_df.drop(columns=['DateNum'], errors='ignore')
+
+    grid = daily_grid(pivot_df, date_col)
+    smoothed = SMOOTHERS[method](grid.to_numpy(dtype='float64'), **kwargs)
+    smoothed = pd.DataFrame(smoothed, index=grid.index, columns=grid.columns)
+
+    dates = pd.to_datetime(pivot_df[date_col])
+    result = smoothed.loc[dates].reset_index(drop=True)
+    result.insert(0, date_col, dates.to_numpy())
+    return result
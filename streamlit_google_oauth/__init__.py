@@ -1,10 +1,79 @@
-import webbrowser
-import streamlit as st
+import time
 import asyncio
+import threading
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+
+import httpx
+import streamlit as st
 from httpx_oauth.clients.google import GoogleOAuth2
 
-__version__ = "0.1"
+__version__ = "0.2"
+
+# Identidades verificadas que se recuerdan por proceso (access_token -> usuario)
+IDENTITY_CACHE_SIZE = 1024
+# Si el token no informa vencimiento, cuánto se confía en la identidad verificada
+IDENTITY_TTL = 3600
+# Tiempo máximo de espera de cada llamada a Google
+REQUEST_TIMEOUT = 30
+
+
+################################################################################
+# Loop y cliente compartidos por el proceso
+################################################################################
+
+class _EventLoopThread:
+    # Un loop de asyncio vivo en un hilo aparte: las corrutinas se envían desde los
+    # reruns de Streamlit sin crear y destruir un loop (y sus conexiones) cada vez
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="google-oauth-loop", daemon=True).start()
+            return self._loop
+
+    def run(self, coro, timeout=REQUEST_TIMEOUT):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop()).result(timeout)
+
+
+class PooledGoogleOAuth2(GoogleOAuth2):
+    # httpx_oauth abre un AsyncClient por pedido; este reutiliza uno solo (pool de
+    # conexiones keep-alive) que vive en el loop compartido
+    _httpx_client = None
+
+    @asynccontextmanager
+    async def get_httpx_client(self):
+        if self._httpx_client is None:
+            self._httpx_client = httpx.AsyncClient()
+        yield self._httpx_client
+
+
+_loop = _EventLoopThread()
+_clients = {}
+_authorization_urls = {}
+_identities = OrderedDict()
+_lock = threading.Lock()
+
 
+def get_client(client_id, client_secret):
+    key = (client_id, client_secret)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = PooledGoogleOAuth2(client_id, client_secret)
+        return _clients[key]
+
+
+def run(coro):
+    return _loop.run(coro)
+
+
+################################################################################
+# Llamadas a Google
+################################################################################
 
 async def write_authorization_url(client, redirect_uri):
     authorization_url = await client.get_authorization_url(
@@ -29,6 +98,42 @@ async def revoke_token(client, token):
     return await client.revoke_token(token)
 
 
+def authorization_url(client, redirect_uri):
+    # La URL no depende de la sesión: se arma una vez por cliente y redirect_uri
+    key = (client.client_id, redirect_uri)
+    if key not in _authorization_urls:
+        _authorization_urls[key] = run(write_authorization_url(client=client, redirect_uri=redirect_uri))
+    return _authorization_urls[key]
+
+
+def verified_identity(client, token):
+    # (user_id, user_email) del token, verificado contra Google una vez hasta que venza
+    access_token = token["access_token"]
+    now = time.time()
+    with _lock:
+        cached = _identities.get(access_token)
+        if cached is not None and cached[1] > now:
+            _identities.move_to_end(access_token)
+            return cached[0]
+
+    identity = run(get_user_info(client=client, token=access_token))
+    expires_at = token.get("expires_at") or now + IDENTITY_TTL
+
+    with _lock:
+        _identities[access_token] = (identity, expires_at)
+        _identities.move_to_end(access_token)
+        # Se descartan los vencidos y, si sigue excediendo el tamaño, los menos usados
+        for key in [k for k, v in _identities.items() if v[1] <= now]:
+            del _identities[key]
+        while len(_identities) > IDENTITY_CACHE_SIZE:
+            _identities.popitem(last=False)
+    return identity
+
+
+################################################################################
+# Componentes
+################################################################################
+
 def nav_to(url):
     nav_script = """
         <meta http-equiv="refresh" content="0; url='%s'">
@@ -40,12 +145,10 @@ def login_button(authorization_url, button_text):
 
 def logout_button(button_text):
     if st.button(button_text):
-        asyncio.run(
-            revoke_token(
-                client=st.session_state.client,
-                token=st.session_state.token["access_token"],
-            )
-        )
+        access_token = st.session_state.token["access_token"]
+        run(revoke_token(client=st.session_state.client, token=access_token))
+        with _lock:
+            _identities.pop(access_token, None)
         st.session_state.user_email = None
         st.session_state.user_id = None
         st.session_state.token = None
@@ -59,45 +162,37 @@ def login(
     login_button_text="Continue with Google",
     logout_button_text="Logout",
 ):
-    st.session_state.client = GoogleOAuth2(client_id, client_secret)
-    authorization_url = asyncio.run(
-        write_authorization_url(
-            client=st.session_state.client, redirect_uri=redirect_uri
-        )
-    )
+    st.session_state.client = client = get_client(client_id, client_secret)
     if "token" not in st.session_state:
         st.session_state.token = None
 
-    if st.session_state.token is None:
-        try:
-            code = st.query_params()["code"]
-        except:
-            login_button(authorization_url, login_button_text)
-        else:
-            # Verify token is correct:
-            try:
-                token = asyncio.run(
-                    write_access_token(
-                        client=st.session_state.client,
-                        redirect_uri=redirect_uri,
-                        code=code,
-                    )
-                )
-            except:
-                login_button(authorization_url, login_button_text)
-            else:
-                # Check if token has expired:
-                if token.is_expired():
-                    login_button(authorization_url, login_button_text)
-                else:
-                    st.session_state.token = token
-                    st.session_state.user_id, st.session_state.user_email = asyncio.run(
-                        get_user_info(
-                            client=st.session_state.client, token=token["access_token"]
-                        )
-                    )
-                    #logout_button(button_text=logout_button_text)
-                    return (st.session_state.user_id, st.session_state.user_email)
-    else:
-        #logout_button(button_text=logout_button_text)
-        return (st.session_state.user_id, st.session_state.user_email)
\ No newline at end of file
+    # Sesión ya logueada: sin pedidos a Google mientras el token no venza
+    token = st.session_state.token
+    if token is not None:
+        if not token.is_expired():
+            st.session_state.user_id, st.session_state.user_email = verified_identity(client, token)
+            #logout_button(button_text=logout_button_text)
+            return (st.session_state.user_id, st.session_state.user_email)
+        st.session_state.token = None
+
+    code = st.query_params.get("code")
+    if code is None:
+        login_button(authorization_url(client, redirect_uri), login_button_text)
+        return None
+
+    # Verify token is correct:
+    try:
+        token = run(write_access_token(client=client, redirect_uri=redirect_uri, code=code))
+    except Exception:
+        login_button(authorization_url(client, redirect_uri), login_button_text)
+        return None
+
+    # Check if token has expired:
+    if token.is_expired():
+        login_button(authorization_url(client, redirect_uri), login_button_text)
+        return None
+
+    st.session_state.token = token
+    st.session_state.user_id, st.session_state.user_email = verified_identity(client, token)
+    #logout_button(button_text=logout_button_text)
+    return (st.session_state.user_id, st.session_state.user_email)
@@ -0,0 +1,69 @@
+import pandas as pd
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+import ndvi
+import ndvi_store
+from ndvi_store import NDVIStore, extract_mean_ndvi_cached
+
+SEASON_2022 = ('2022-01-01', '2022-06-01')
+SEASON_2025 = ('2025-01-01', '2025-06-01')
+BOTH = ('2022-01-01', '2025-06-01')
+
+
+@pytest.fixture
+def fields():
+    return gpd.GeoDataFrame({'field': ['Lote 1']}, geometry=[box(-60.0, -34.0, -59.99, -33.99)], crs='EPSG:4326')
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    # Extractor falso: una imagen el día 15 de cada mes del rango pedido
+    calls = []
+
+    def fake_records(gdf, field_col, start_date, end_date, mask=None, page_days=None):
+        calls.append((start_date, end_date))
+        dates = (pd.date_range(start_date, end_date, freq='MS', inclusive='left') + pd.Timedelta(days=14)).strftime('%Y-%m-%d')
+        dates = [d for d in dates if d < end_date]
+        yield pd.DataFrame({field_col: gdf[field_col].iloc[0], 'Date': dates, 'Mean_NDVI': 0.5})
+
+    monkeypatch.setattr(ndvi, 'iter_ndvi_records', fake_records)
+    return calls
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NDVIStore(str(tmp_path / 'store.sqlite'))
+
+
+def months(df):
+    return sorted(df['Date'].str[:7].unique())
+
+
+def test_disjoint_seasons_fill_the_gap(fields, calls, store):
+    extract_mean_ndvi_cached(fields, 'field', store, *SEASON_2022, mode='batch')
+    extract_mean_ndvi_cached(fields, 'field', store, *SEASON_2025, mode='batch')
+    calls.clear()
+
+    df, failures = extract_mean_ndvi_cached(fields, 'field', store, *BOTH, mode='batch')
+
+    assert not failures
+    assert len(calls) == 1
+    assert calls[0][0] < '2022-06-01' and calls[0][1] == '2025-01-01'
+    assert months(df) == [m.strftime('%Y-%m') for m in pd.date_range('2022-01-01', '2025-05-01', freq='MS')]
+
+
+def test_earlier_season_keeps_later_one(fields, calls, store):
+    extract_mean_ndvi_cached(fields, 'field', store, *SEASON_2025, mode='batch')
+    extract_mean_ndvi_cached(fields, 'field', store, *SEASON_2022, mode='batch')
+    calls.clear()
+
+    # Las dos campañas quedan guardadas: cambiar de una a otra no vuelve a pedir nada
+    for window in (SEASON_2025, SEASON_2022):
+        df, _ = extract_mean_ndvi_cached(fields, 'field', store, *window, mode='batch')
+        assert len(df) == 5
+    assert calls == []
+
+    key = ndvi_store.field_key(fields.geometry.iloc[0])
+    assert store.coverage([key])[key] == [SEASON_2022, SEASON_2025]